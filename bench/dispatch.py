@@ -0,0 +1,110 @@
+"""
+Накладные расходы диспетчеризации текстовых сообщений: от feed_update до входа
+в хендлер, без работы самого хендлера. Сравнивает обычную цепочку фильтров
+роутеров (FAST_PATH=0) и словарь utils/fastpath.py (FAST_PATH=1); каждый режим
+запускается в отдельном процессе, потому что роутеры — синглтоны модулей.
+
+    python bench/dispatch.py --iterations 20000
+
+FSM хранится в памяти (MemoryStorage), чтобы в замер не попадал Redis.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import harness  # noqa: E402  (выставляет sys.path на src)
+
+# (подпись, текст, состояние FSM)
+CASES = [
+    ("button first", "🎴 Мои карты", None),
+    ("button last", "📝 Регистрация", None),
+    ("button in FSM", "👤 Профиль", "LoginFlow:phone"),
+    ("/biz_ prefix", "/biz_00000000-0000-0000-0000-000000000000", None),
+    ("4-digit code", "1234", None),
+    ("FSM input", "+79990000000", "LoginFlow:phone"),
+    ("unmatched", "привет", None),
+]
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--iterations", type=int, default=10000, help="апдейтов на каждый случай")
+    p.add_argument("--mode", choices=["before", "after"], help=argparse.SUPPRESS)
+    return p.parse_args()
+
+async def measure(iterations: int) -> dict:
+    from aiogram import BaseMiddleware, Bot
+    from aiogram.fsm.storage.base import StorageKey
+    from aiogram.fsm.storage.memory import MemoryStorage
+    import main
+
+    class Probe(BaseMiddleware):
+        """Inner-middleware: отмечает, какой хендлер выбран, и не вызывает его."""
+
+        def __init__(self):
+            self.last = None
+
+        async def __call__(self, handler, event, data):
+            self.last = data["handler"].callback.__qualname__
+
+    bot = Bot(token="123456:bench", session=harness.make_stub_session(), default=main.DEFAULT_BOT_PROPS)
+    dp = main.build_dispatcher()
+    dp.fsm.storage = MemoryStorage()
+    probe = Probe()
+    dp.message.middleware(probe)
+    factory = harness.UpdateFactory()
+
+    results = {}
+    for label, text, state in CASES:
+        uid = 1_000_000 + len(results)
+        key = StorageKey(bot_id=bot.id, chat_id=uid, user_id=uid)
+        await dp.fsm.storage.set_state(key, state)
+        updates = [factory.message(uid, text) for _ in range(iterations)]
+        for update in updates[:100]:  # прогрев
+            await dp.feed_update(bot, update)
+        probe.last = None
+        started = time.perf_counter()
+        for update in updates:
+            await dp.feed_update(bot, update)
+        elapsed = time.perf_counter() - started
+        results[label] = {"us": elapsed / iterations * 1e6, "handler": probe.last or "—"}
+    return results
+
+def run_mode(mode: str, iterations: int) -> dict:
+    env = dict(os.environ, FAST_PATH="1" if mode == "after" else "0", TRACE_ENABLED="0")
+    out = subprocess.run(
+        [sys.executable, __file__, "--mode", mode, "--iterations", str(iterations)],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main():
+    args = parse_args()
+    if args.mode:
+        harness.setup_env(harness.free_port())
+        print(json.dumps(asyncio.run(measure(args.iterations)), ensure_ascii=False))
+        return
+
+    runs = defaultdict(dict)
+    for mode in ("before", "after"):
+        for label, res in run_mode(mode, args.iterations).items():
+            runs[label][mode] = res
+
+    print(f"{'case':<16} {'before us':>10} {'after us':>10} {'speedup':>8}  handler")
+    for label, _, _ in CASES:
+        before, after = runs[label]["before"], runs[label]["after"]
+        handler = before["handler"] if before["handler"] == after["handler"] else \
+            f"{before['handler']} != {after['handler']}"
+        print(
+            f"{label:<16} {before['us']:>10.1f} {after['us']:>10.1f} "
+            f"{before['us'] / after['us']:>7.2f}x  {handler}"
+        )
+
+if __name__ == "__main__":
+    main()
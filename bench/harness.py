@@ -0,0 +1,300 @@
+"""
+Общие детали для бенчмарков: заглушка ForFriends API на aiohttp, заглушка
+сессии Bot API, фабрика синтетических апдейтов и замер хендлеров.
+
+Модуль нужно импортировать ДО config/main: setup_env() выставляет переменные
+окружения, которые config читает при импорте.
+"""
+import asyncio
+import os
+import random
+import socket
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Union, get_args, get_origin
+
+from aiohttp import web
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def setup_env(api_port: int, **overrides: str):
+    os.environ["API_BASE"] = f"http://127.0.0.1:{api_port}/api/v1"
+    os.environ.setdefault("BOT_TOKEN", "123456:bench")
+    os.environ.setdefault("REDIS_HOST", "127.0.0.1")
+    os.environ.setdefault("METRICS_ENABLED", "0")
+    for key, value in overrides.items():
+        os.environ[key] = value
+
+def use_fake_redis():
+    """Подменяет общий клиент Redis на fakeredis (pip install fakeredis)."""
+    import fakeredis
+    from utils import redis_client
+    redis_client.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+# ===== Заглушка ForFriends API =====
+
+WORDS = [
+    "кофейня", "кофе", "пекарня", "бар", "чайхана", "бургерная", "пиццерия",
+    "зерна", "лавка", "дом", "уголок", "точка", "мастерская", "буфет", "столовая",
+]
+
+class MockApi:
+    """Минимальная копия эндпоинтов, которые дергает бот, с настраиваемой задержкой."""
+
+    def __init__(self, businesses: int = 500, latency_ms: float = 5.0, seed: int = 1):
+        rnd = random.Random(seed)
+        self.latency = latency_ms / 1000
+        self.businesses = [
+            {"id": str(uuid.UUID(int=rnd.getrandbits(128))),
+             "name": f"{rnd.choice(WORDS).capitalize()} {rnd.choice(WORDS)} {i}"}
+            for i in range(businesses)
+        ]
+        self.punch_cards = {
+            b["id"]: [{"id": str(uuid.uuid4()), "name": f"Карта {j}"} for j in range(3)]
+            for b in self.businesses
+        }
+        self.customers: Dict[str, List[Dict[str, Any]]] = {}
+        self.requests = 0
+        self.runner: web.AppRunner | None = None
+
+    def _cards(self, customer_id: str) -> List[Dict[str, Any]]:
+        if customer_id not in self.customers:
+            self.customers[customer_id] = [
+                {"id": str(uuid.uuid4()), "name": f"Карта {j}", "reward_name": "Кофе",
+                 "current_stamp_count": j % 7, "total_stamp_count": 6}
+                for j in range(12)
+            ]
+        return self.customers[customer_id]
+
+    @web.middleware
+    async def _latency(self, request: web.Request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    async def login(self, request: web.Request):
+        body = await request.json()
+        customer_id = str(uuid.uuid5(uuid.NAMESPACE_OID, body.get("phone", "")))
+        resp = web.json_response({"data": {"id": customer_id, "name": "Bench"}})
+        resp.set_cookie("session", customer_id)
+        return resp
+
+    async def register(self, request: web.Request):
+        return await self.login(request)
+
+    async def ok(self, request: web.Request):
+        return web.json_response({"data": {}})
+
+    async def customer(self, request: web.Request):
+        return web.json_response({"data": {"name": "Bench", "phone": "+70000000000", "language": "ru"}})
+
+    async def customer_cards(self, request: web.Request):
+        cards = self._cards(request.match_info["cid"])
+        if request.method == "POST":
+            return web.json_response({"data": cards[0]}, status=201)
+        limit = int(request.query.get("limit", 100))
+        offset = int(request.query.get("offset", 0))
+        return web.json_response({"data": cards[offset:offset + limit]})
+
+    async def customer_card(self, request: web.Request):
+        card_id = request.match_info["card"]
+        for c in self._cards(request.match_info["cid"]):
+            if c["id"] == card_id:
+                return web.json_response({"data": c})
+        return web.json_response({"detail": "not found"}, status=404)
+
+    async def businesses_list(self, request: web.Request):
+        q = request.query.get("q", "").lower()
+        limit = int(request.query.get("limit", 10))
+        offset = int(request.query.get("offset", 0))
+        items = [b for b in self.businesses if q in b["name"].lower()] if q else self.businesses
+        return web.json_response({"data": items[offset:offset + limit]})
+
+    async def business_cards(self, request: web.Request):
+        return web.json_response({"data": self.punch_cards.get(request.match_info["bid"], [])})
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._latency])
+        p = "/api/v1"
+        app.router.add_post(f"{p}/auth/customers/login", self.login)
+        app.router.add_post(f"{p}/auth/customers/register", self.register)
+        app.router.add_post(f"{p}/auth/customers/{{cid}}/send-code", self.ok)
+        app.router.add_get(f"{p}/auth/customers/{{cid}}/confirm", self.ok)
+        app.router.add_get(f"{p}/customers/{{cid}}/", self.customer)
+        app.router.add_route("*", f"{p}/customers/{{cid}}/cards/", self.customer_cards)
+        app.router.add_get(f"{p}/customers/{{cid}}/cards/{{card}}", self.customer_card)
+        app.router.add_get(f"{p}/businesses/", self.businesses_list)
+        app.router.add_get(f"{p}/businesses/{{bid}}/punch-cards/", self.business_cards)
+        return app
+
+    async def start(self, port: int):
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+# ===== Заглушка Bot API =====
+
+def make_stub_session(latency_ms: float = 0.0):
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Chat, Message, PhotoSize, User
+
+    class StubSession(BaseSession):
+        """Отвечает на любой метод Bot API правдоподобным результатом без сети."""
+
+        def __init__(self):
+            super().__init__()
+            self.calls: Dict[str, int] = defaultdict(int)
+            self._message_id = 0
+
+        async def close(self):
+            pass
+
+        async def stream_content(self, *args, **kwargs):  # pragma: no cover
+            raise NotImplementedError
+
+        def _message(self, method) -> Message:
+            self._message_id += 1
+            chat_id = getattr(method, "chat_id", 0) or 0
+            photo = None
+            if type(method).__name__ == "SendPhoto":
+                fid = f"bench-photo-{self._message_id}"
+                photo = [PhotoSize(file_id=fid, file_unique_id=fid, width=290, height=290)]
+            return Message(
+                message_id=self._message_id,
+                date=datetime.now(),
+                chat=Chat(id=chat_id, type="private"),
+                text=getattr(method, "text", None),
+                photo=photo,
+            )
+
+        async def make_request(self, bot, method, timeout=None):
+            self.calls[type(method).__name__] += 1
+            if latency_ms:
+                await asyncio.sleep(latency_ms / 1000)
+            returning = method.__returning__
+            options = get_args(returning) if get_origin(returning) is Union else (returning,)
+            if Message in options and not type(method).__name__.startswith("Edit"):
+                return self._message(method)
+            if bool in options:
+                return True
+            if User in options:
+                return User(id=bot.id, is_bot=True, first_name="bench", username="bench_bot")
+            if Message in options:
+                return self._message(method)
+            return None
+
+    return StubSession()
+
+# ===== Синтетические апдейты =====
+
+class UpdateFactory:
+    def __init__(self):
+        self._update_id = 0
+        self._message_id = 0
+
+    def _next(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"}
+
+    def message(self, user_id: int, text: str):
+        from aiogram.types import Update
+        self._message_id += 1
+        msg = {
+            "message_id": self._message_id, "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id), "text": text,
+        }
+        if text.startswith("/"):
+            cmd = text.split()[0]
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(cmd)}]
+        return Update.model_validate({"update_id": self._next(), "message": msg})
+
+    def callback(self, user_id: int, data: str):
+        from aiogram.types import Update
+        self._message_id += 1
+        return Update.model_validate({"update_id": self._next(), "callback_query": {
+            "id": str(self._update_id), "from": self._user(user_id), "chat_instance": "bench", "data": data,
+            "message": {"message_id": self._message_id, "date": int(time.time()),
+                        "chat": {"id": user_id, "type": "private"}, "text": "…"},
+        }})
+
+    def inline_query(self, user_id: int, query: str):
+        from aiogram.types import Update
+        return Update.model_validate({"update_id": self._next(), "inline_query": {
+            "id": str(self._update_id), "from": self._user(user_id), "query": query, "offset": "",
+        }})
+
+    def chosen(self, user_id: int, result_id: str, query: str = ""):
+        from aiogram.types import Update
+        return Update.model_validate({"update_id": self._next(), "chosen_inline_result": {
+            "result_id": result_id, "from": self._user(user_id), "query": query,
+        }})
+
+# ===== Замер хендлеров =====
+
+def make_handler_timer():
+    from aiogram import BaseMiddleware
+
+    class HandlerTimer(BaseMiddleware):
+        """Inner-middleware: сырые длительности хендлеров для перцентилей."""
+
+        def __init__(self):
+            self.samples: Dict[str, List[float]] = defaultdict(list)
+            self.errors: Dict[str, int] = defaultdict(int)
+
+        async def __call__(self, handler: Callable[..., Awaitable[Any]], event, data: Dict[str, Any]):
+            handler_obj = data.get("handler")
+            name = handler_obj.callback.__qualname__ if handler_obj else "unknown"
+            started = time.perf_counter()
+            try:
+                return await handler(event, data)
+            except Exception:
+                self.errors[name] += 1
+                raise
+            finally:
+                self.samples[name].append(time.perf_counter() - started)
+
+    return HandlerTimer()
+
+def install_handler_timer(dp) -> Any:
+    timer = make_handler_timer()
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(timer)
+    return timer
+
+def print_table(title: str, samples: Dict[str, List[float]], errors: Dict[str, int] | None = None):
+    print(f"\n{title}")
+    print(f"{'name':<40} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for name, values in sorted(samples.items(), key=lambda kv: -len(kv[1])):
+        print(
+            f"{name:<40} {len(values):>7} {percentile(values, 50) * 1000:>9.2f} "
+            f"{percentile(values, 99) * 1000:>9.2f} {max(values) * 1000:>9.2f} "
+            f"{(errors or {}).get(name, 0):>7}"
+        )
@@ -0,0 +1,116 @@
+"""
+Нагрузочный прогон: тот же Dispatcher и роутеры, что в main.py, синтетические
+апдейты через feed_update, локальная заглушка API и заглушка Bot API.
+
+    python bench/loadtest.py --users 200 --actions 20
+    python bench/loadtest.py --fake-redis          # без локального Redis
+
+Печатает пропускную способность и p50/p99 по хендлерам и типам апдейтов.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import harness  # noqa: E402  (выставляет sys.path на src)
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--users", type=int, default=100, help="одновременных пользователей")
+    p.add_argument("--actions", type=int, default=20, help="действий на пользователя после логина")
+    p.add_argument("--businesses", type=int, default=500, help="заведений в заглушке API")
+    p.add_argument("--api-latency", type=float, default=5.0, help="задержка заглушки API, мс")
+    p.add_argument("--tg-latency", type=float, default=0.0, help="задержка заглушки Bot API, мс")
+    p.add_argument("--fake-redis", action="store_true", help="fakeredis вместо локального Redis")
+    p.add_argument("--throttle", action="store_true", help="включить планировщик лимитов Telegram")
+    p.add_argument("--seed", type=int, default=1)
+    return p.parse_args()
+
+async def user_script(uid: int, actions: int, rnd: random.Random, api: "harness.MockApi", factory):
+    """Последовательность апдейтов одного пользователя: вход, затем смесь действий."""
+    phone = f"+7{uid:010d}"
+    yield factory.message(uid, "/start")
+    yield factory.message(uid, "🔐 Войти")
+    yield factory.message(uid, phone)
+    yield factory.message(uid, "password123")
+
+    for _ in range(actions):
+        kind = rnd.choices(
+            ["inline", "chosen", "mycards", "page", "qr", "profile"],
+            weights=[40, 10, 15, 5, 25, 5],
+        )[0]
+        if kind == "inline":
+            word = rnd.choice(harness.WORDS)
+            for i in range(1, min(len(word), 4) + 1):
+                yield factory.inline_query(uid, word[:i])
+        elif kind == "chosen":
+            yield factory.chosen(uid, rnd.choice(api.businesses)["id"])
+        elif kind == "mycards":
+            yield factory.message(uid, "🎴 Мои карты")
+        elif kind == "page":
+            yield factory.callback(uid, "cards:page:1")
+        elif kind == "qr":
+            import uuid
+            customer_id = str(uuid.uuid5(uuid.NAMESPACE_OID, phone))
+            card = rnd.choice(api._cards(customer_id))
+            yield factory.callback(uid, f"qr:stamp:{card['id']}")
+        else:
+            yield factory.message(uid, "👤 Профиль")
+
+async def run(args):
+    port = harness.free_port()
+    harness.setup_env(port, CATALOG_SYNC_INTERVAL="3600")
+    if args.fake_redis:
+        harness.use_fake_redis()
+
+    from aiogram import Bot
+    import main
+    from utils.throttle import send_scheduler
+
+    api = harness.MockApi(businesses=args.businesses, latency_ms=args.api_latency, seed=args.seed)
+    await api.start(port)
+
+    session = harness.make_stub_session(args.tg_latency)
+    bot = Bot(token="123456:bench", session=session, default=main.DEFAULT_BOT_PROPS)
+    if args.throttle:
+        bot.session.middleware(send_scheduler)
+    dp = main.build_dispatcher()
+    timer = harness.install_handler_timer(dp)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    await asyncio.sleep(0.5)  # первая синхронизация каталога
+
+    factory = harness.UpdateFactory()
+    rnd = random.Random(args.seed)
+    by_type = defaultdict(list)
+    failures = 0
+
+    async def drive(uid: int):
+        nonlocal failures
+        async for update in user_script(uid, args.actions, random.Random(rnd.random()), api, factory):
+            started = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                failures += 1
+            by_type[update.event_type].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(drive(1_000_000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)
+    await api.stop()
+
+    total = sum(len(v) for v in by_type.values())
+    print(f"updates: {total}  time: {elapsed:.2f}s  throughput: {total / elapsed:.0f} upd/s  failures: {failures}")
+    print(f"api requests: {api.requests}  bot api calls: {sum(session.calls.values())}")
+    harness.print_table("per update type", by_type)
+    harness.print_table("per handler", timer.samples, timer.errors)
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
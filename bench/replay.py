@@ -0,0 +1,127 @@
+"""
+Воспроизведение записанного потока апдейтов (RECORD_FILE в боте) через тот же
+Dispatcher, что в main.py, с локальной заглушкой API и заглушкой Bot API.
+
+    python bench/replay.py updates.jsonl.gz                 # в реальном темпе
+    python bench/replay.py updates.jsonl.gz --speed 10      # в 10 раз быстрее
+    python bench/replay.py updates.jsonl.gz --speed 0       # без пауз
+    python bench/replay.py updates.jsonl.gz --fake-redis    # без локального Redis
+
+Апдейты запускаются отдельными задачами в момент, сдвинутый от начала записи
+(как в webhook-режиме с handle_in_background). Печатает отставание от
+расписания и p50/p99 по типам апдейтов и хендлерам.
+
+Заглушка API не знает id заведений и карточек из продакшена, поэтому часть
+колбэков получит 404 — это нормальный путь обработки, нагрузку он создаёт.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import harness  # noqa: E402  (выставляет sys.path на src)
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("file", help="gzip JSONL, записанный RECORD_FILE")
+    p.add_argument("--speed", type=float, default=1.0, help="множитель темпа; 0 — без пауз")
+    p.add_argument("--limit", type=int, default=0, help="воспроизвести только первые N апдейтов")
+    p.add_argument("--businesses", type=int, default=500, help="заведений в заглушке API")
+    p.add_argument("--api-latency", type=float, default=5.0, help="задержка заглушки API, мс")
+    p.add_argument("--tg-latency", type=float, default=0.0, help="задержка заглушки Bot API, мс")
+    p.add_argument("--fake-redis", action="store_true", help="fakeredis вместо локального Redis")
+    p.add_argument("--throttle", action="store_true", help="включить планировщик лимитов Telegram")
+    return p.parse_args()
+
+def load_records(path: str, limit: int = 0):
+    records = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            records.append(json.loads(line))
+            if limit and len(records) >= limit:
+                break
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+async def run(args):
+    records = load_records(args.file, args.limit)
+    if not records:
+        print("пустая запись")
+        return
+
+    port = harness.free_port()
+    harness.setup_env(port, CATALOG_SYNC_INTERVAL="3600")
+    if args.fake_redis:
+        harness.use_fake_redis()
+
+    from aiogram import Bot
+    from aiogram.types import Update
+    import main
+    from utils.throttle import send_scheduler
+
+    api = harness.MockApi(businesses=args.businesses, latency_ms=args.api_latency)
+    await api.start(port)
+
+    session = harness.make_stub_session(args.tg_latency)
+    bot = Bot(token="123456:bench", session=session, default=main.DEFAULT_BOT_PROPS)
+    if args.throttle:
+        bot.session.middleware(send_scheduler)
+    dp = main.build_dispatcher()
+    timer = harness.install_handler_timer(dp)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    await asyncio.sleep(0.5)  # первая синхронизация каталога
+
+    updates = [(r["ts"], Update.model_validate(r["update"], context={"bot": bot})) for r in records]
+    first_ts = updates[0][0]
+    by_type = defaultdict(list)
+    lag = []
+    failures = 0
+
+    async def feed(update):
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            failures += 1
+        by_type[update.event_type].append(time.perf_counter() - started)
+
+    tasks = []
+    started = time.perf_counter()
+    for ts, update in updates:
+        if args.speed > 0:
+            due = (ts - first_ts) / args.speed
+            delay = due - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag.append(max(0.0, (time.perf_counter() - started) - due))
+        tasks.append(asyncio.create_task(feed(update)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)
+    await api.stop()
+
+    recorded = updates[-1][0] - first_ts
+    print(
+        f"updates: {len(updates)}  recorded span: {recorded:.1f}s  replayed in: {elapsed:.2f}s  "
+        f"throughput: {len(updates) / elapsed:.0f} upd/s  failures: {failures}"
+    )
+    if lag:
+        print(f"schedule lag p50: {harness.percentile(lag, 50) * 1000:.1f} ms  "
+              f"p99: {harness.percentile(lag, 99) * 1000:.1f} ms")
+    print(f"api requests: {api.requests}  bot api calls: {sum(session.calls.values())}")
+    harness.print_table("per update type", by_type)
+    harness.print_table("per handler", timer.samples, timer.errors)
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
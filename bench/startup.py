@@ -0,0 +1,139 @@
+"""
+Холодный старт бота: профиль импортов и проверка бюджета времени.
+
+    python bench/startup.py                      # отчёт + проверка бюджета
+    python bench/startup.py --budget 1.5 --runs 5
+    STARTUP_BUDGET=1.5 python bench/startup.py   # то же через окружение (для CI)
+
+Каждый прогон — новый процесс python: import main, Bot, build_dispatcher,
+setup_metrics/tracing/recorder и startup-хуки (init_http, фоновые задачи) —
+всё, что происходит до первого getUpdates / set_webhook. Сеть не трогается.
+Медиана прогонов сравнивается с бюджетом; при превышении код выхода 1.
+
+Профиль импортов — из `python -X importtime`: собственное и накопленное
+время по модулям и по пакетам верхнего уровня. Отдельно печатается, какие
+из заведомо тяжёлых модулей (HEAVY) оказались загружены к моменту готовности.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# Тяжёлые зависимости, которые не должны грузиться на старте
+HEAVY = ("qrcode", "PIL", "fakeredis")
+
+CHILD = r"""
+import asyncio, sys, time
+t0 = time.perf_counter()
+from aiogram import Bot
+import main
+from config import DEFAULT_BOT_PROPS, METRICS_ENABLED
+
+async def ready():
+    bot = Bot(token="123456:startup", default=DEFAULT_BOT_PROPS)
+    bot.session.middleware(main.send_scheduler)
+    dp = main.build_dispatcher()
+    if METRICS_ENABLED:
+        main.setup_metrics(dp, bot)
+    main.setup_tracing(dp, bot)
+    main.setup_recorder(dp)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    print("READY", time.perf_counter() - t0, ",".join(m for m in HEAVY if m in sys.modules), flush=True)
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)
+    await bot.session.close()
+
+HEAVY = %r
+asyncio.run(ready())
+"""
+
+def parse_args():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET", "3.0")),
+                   help="секунд от запуска процесса до готовности (STARTUP_BUDGET)")
+    p.add_argument("--runs", type=int, default=3, help="прогонов для медианы")
+    p.add_argument("--top", type=int, default=15, help="строк в профиле импортов")
+    return p.parse_args()
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("BOT_TOKEN", "123456:startup")
+    env.setdefault("REDIS_HOST", "127.0.0.1")
+    # на время замера фоновые задачи не нужны: они стартуют и сразу гасятся
+    env.setdefault("CATALOG_INDEX", "0")
+    env.pop("RECORD_FILE", None)
+    return env
+
+def run_once() -> tuple[float, float, str]:
+    """(секунд до READY с точки зрения родителя, то же изнутри процесса, тяжёлые модули)."""
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", CHILD % (HEAVY,)],
+        cwd=SRC, env=child_env(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    wall = inside = None
+    heavy = ""
+    for line in proc.stdout:
+        if line.startswith("READY"):
+            wall = time.perf_counter() - started
+            _, inside_s, *rest = line.rstrip("\n").split(" ", 2)
+            inside = float(inside_s)
+            heavy = rest[0] if rest else ""
+    proc.wait()
+    if wall is None:
+        raise SystemExit(f"startup failed (exit code {proc.returncode})")
+    return wall, inside, heavy
+
+def import_profile() -> list[tuple[str, int, int]]:
+    """[(модуль, собственное мкс, накопленное мкс)] из -X importtime для import main."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=SRC, env=child_env(), capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def print_profile(rows, top: int):
+    print(f"\nslowest modules by cumulative import time (import main)")
+    print(f"{'module':<48} {'self ms':>9} {'cum ms':>9}")
+    for name, self_us, cum_us in sorted(rows, key=lambda r: -r[2])[:top]:
+        print(f"{name:<48} {self_us / 1000:>9.1f} {cum_us / 1000:>9.1f}")
+
+    by_package = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    total = sum(by_package.values())
+    print(f"\nself time by top-level package (total {total / 1000:.0f} ms)")
+    for package, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"{package:<48} {us / 1000:>9.1f} {us / total * 100:>8.1f}%")
+
+def main():
+    args = parse_args()
+    print_profile(import_profile(), args.top)
+
+    runs = [run_once() for _ in range(args.runs)]
+    wall = statistics.median(r[0] for r in runs)
+    inside = statistics.median(r[1] for r in runs)
+    heavy = {m for r in runs for m in r[2].split(",") if m}
+
+    print(f"\ncold start to ready: median {wall:.2f}s over {args.runs} runs "
+          f"(in-process {inside:.2f}s), budget {args.budget:.2f}s")
+    if heavy:
+        print(f"heavy modules loaded at startup: {', '.join(sorted(heavy))}")
+    if wall > args.budget:
+        print("FAIL: startup budget exceeded")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
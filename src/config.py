@@ -6,4 +6,143 @@ API_BASE = os.getenv("API_BASE", "https://api.forfriends.space/api/v1")
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 
-DEFAULT_BOT_PROPS = DefaultBotProperties(parse_mode="HTML")
\ No newline at end of file
+# Режим получения апдейтов: polling | webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/bot/webhook")
+TELEGRAM_SECRET = os.getenv("TELEGRAM_SECRET")
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+
+# HTTP-клиент к API: пул соединений и кэш DNS
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "30"))
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+
+# Кэш сессий (customer_id + cookies) в памяти процесса
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
+# Сессия в Redis (hash session:{chat_id}) живёт SESSION_TTL с последнего обращения;
+# старые ключи customer_id:/cookies: переносятся `python redis_admin.py migrate` перед выкладкой;
+# SESSION_MIGRATE_LEGACY=1 — на переходный период искать их при каждой пустой сессии (+1 запрос)
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(30 * 24 * 3600)))
+SESSION_MIGRATE_LEGACY = os.getenv("SESSION_MIGRATE_LEGACY", "0") == "1"
+
+# FSM (регистрация/логин) хранится в Redis и истекает у брошенных сценариев
+FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", "1800"))
+FSM_DATA_TTL = int(os.getenv("FSM_DATA_TTL", "1800"))
+
+# QR: кэш готовых PNG в памяти и file_id загруженных в Telegram картинок
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "512"))
+QR_FILE_ID_TTL = int(os.getenv("QR_FILE_ID_TTL", str(30 * 24 * 3600)))
+# рендер QR в пуле: thread | process, число воркеров и максимум задач в очереди
+QR_EXECUTOR = os.getenv("QR_EXECUTOR", "thread")
+QR_WORKERS = int(os.getenv("QR_WORKERS", "2"))
+QR_MAX_PENDING = int(os.getenv("QR_MAX_PENDING", "32"))
+
+# Inline-поиск заведений: общий кэш результатов и кэш на стороне Telegram
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "60"))
+SEARCH_CACHE_REDIS = os.getenv("SEARCH_CACHE_REDIS", "1") == "1"
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "60"))
+# локальный индекс каталога: 0 — выключить и ходить в API за каждым запросом
+CATALOG_INDEX = os.getenv("CATALOG_INDEX", "1") == "1"
+CATALOG_SYNC_INTERVAL = int(os.getenv("CATALOG_SYNC_INTERVAL", "300"))
+
+# Карточки заведения: свежие FRESH секунд, потом отдаются устаревшими
+# и обновляются в фоне, пока не истечёт STALE
+PUNCH_CARDS_CACHE_SIZE = int(os.getenv("PUNCH_CARDS_CACHE_SIZE", "1000"))
+PUNCH_CARDS_FRESH_TTL = int(os.getenv("PUNCH_CARDS_FRESH_TTL", "30"))
+PUNCH_CARDS_STALE_TTL = int(os.getenv("PUNCH_CARDS_STALE_TTL", "600"))
+
+# /mycards: карточек на одной странице
+CARDS_PAGE_SIZE = int(os.getenv("CARDS_PAGE_SIZE", "5"))
+
+# Лимиты исходящих сообщений Telegram (сообщений в секунду)
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+SEND_GROUP_BURST = float(os.getenv("SEND_GROUP_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+# Таймеры (обратный отсчёт кнопки повторной отправки кода)
+TIMER_TICK = float(os.getenv("TIMER_TICK", "1"))
+TIMER_BATCH = int(os.getenv("TIMER_BATCH", "200"))
+RESEND_CODE_DELAY = int(os.getenv("RESEND_CODE_DELAY", "60"))
+RESEND_CODE_STEP = int(os.getenv("RESEND_CODE_STEP", "10"))
+
+# Prometheus: /metrics на том же aiohttp-порту (в polling-режиме тоже)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+
+# Трассировка апдейтов: кольцевой буфер в памяти и, опционально, JSONL-файл
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "500"))
+TRACE_FILE = os.getenv("TRACE_FILE")
+# Telegram id администраторов через запятую (команда /traces)
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()}
+
+# Запись апдейтов для bench/replay.py (gzip JSONL); пусто — выключено.
+# RECORD_SALT задаёт псевдонимы id; без неё соль новая при каждом запуске
+RECORD_FILE = os.getenv("RECORD_FILE")
+RECORD_SALT = os.getenv("RECORD_SALT")
+
+# Обработка апдейтов: общий лимит одновременных, очередь на чат и предел очереди.
+# MAX_CONCURRENT_UPDATES=0 — без ограничений (как было)
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+MAX_WAITING_UPDATES = int(os.getenv("MAX_WAITING_UPDATES", "2000"))
+CHAT_MAX_WAITING = int(os.getenv("CHAT_MAX_WAITING", "10"))
+
+# Шардирование через Redis Streams: при STREAM_INGEST=1 main.py только принимает
+# апдейты (polling/webhook) и кладёт их в updates:{chat_id % STREAM_SHARDS},
+# обрабатывают их процессы worker.py. Каждый шард читает ровно один воркер
+# (WORKER_SHARDS="0,1"; пусто — все), иначе сломается порядок апдейтов чата
+STREAM_INGEST = os.getenv("STREAM_INGEST", "0") == "1"
+STREAM_SHARDS = int(os.getenv("STREAM_SHARDS", "4"))
+STREAM_PREFIX = os.getenv("STREAM_PREFIX", "updates")
+STREAM_GROUP = os.getenv("STREAM_GROUP", "workers")
+STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", "100000"))
+STREAM_BATCH = int(os.getenv("STREAM_BATCH", "50"))
+STREAM_BLOCK_MS = int(os.getenv("STREAM_BLOCK_MS", "5000"))
+# сообщения, не подтверждённые дольше этого (упавший воркер), забираем себе
+STREAM_CLAIM_IDLE_MS = int(os.getenv("STREAM_CLAIM_IDLE_MS", "60000"))
+WORKER_SHARDS = [int(x) for x in os.getenv("WORKER_SHARDS", "").split(",") if x.strip()]
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+# Фоновая проверка прогресса карточек активных пользователей и уведомление
+# «награда готова»; активный — открывал карточки за PROGRESS_ACTIVE_TTL
+PROGRESS_ENABLED = os.getenv("PROGRESS_ENABLED", "1") == "1"
+PROGRESS_INTERVAL = int(os.getenv("PROGRESS_INTERVAL", "300"))
+PROGRESS_BATCH = int(os.getenv("PROGRESS_BATCH", "500"))
+PROGRESS_CONCURRENCY = int(os.getenv("PROGRESS_CONCURRENCY", "10"))
+PROGRESS_ACTIVE_TTL = int(os.getenv("PROGRESS_ACTIVE_TTL", str(7 * 24 * 3600)))
+# сколько недавних отметок активности помнить в памяти (не чаще одной ZADD в минуту на чат)
+PROGRESS_TOUCH_CACHE_SIZE = int(os.getenv("PROGRESS_TOUCH_CACHE_SIZE", "10000"))
+
+# Словарь точных текстов кнопок/префиксов перед цепочкой фильтров роутеров
+FAST_PATH = os.getenv("FAST_PATH", "1") == "1"
+
+# Таймауты API: общий и по префиксам пути ("/businesses=3,/auth=15")
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "3"))
+API_TIMEOUTS = {
+    prefix.strip(): float(seconds)
+    for prefix, seconds in (
+        item.split("=", 1)
+        for item in os.getenv("API_TIMEOUTS", "/businesses=3,/customers=5,/auth=15").split(",")
+        if "=" in item
+    )
+}
+# Повторы GET с retry=True (хвост: (API_RETRIES+1) × таймаут + backoff) и circuit breaker
+API_RETRIES = int(os.getenv("API_RETRIES", "2"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.2"))
+API_BREAKER_THRESHOLD = int(os.getenv("API_BREAKER_THRESHOLD", "5"))
+API_BREAKER_RESET = float(os.getenv("API_BREAKER_RESET", "30"))
+# Условные GET (ETag / Last-Modified): тела ответов по чату в Redis
+HTTP_CACHE_TTL = int(os.getenv("HTTP_CACHE_TTL", str(24 * 3600)))
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "32"))
+HTTP_CACHE_MAX_BODY = int(os.getenv("HTTP_CACHE_MAX_BODY", str(64 * 1024)))
+
+DEFAULT_BOT_PROPS = DefaultBotProperties(parse_mode="HTML")
@@ -3,6 +3,7 @@ from .auth import router as auth_router
 from .profile import router as profile_router
 from .find_cards import router as find_cards_router
 from .mycards import router as mycards_router
+from .debug import router as debug_router
 
 __all__ = [
     "start_router",
@@ -10,4 +11,5 @@ __all__ = [
     "profile_router",
     "find_cards_router",
     "mycards_router",
+    "debug_router",
 ]
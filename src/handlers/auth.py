@@ -1,19 +1,21 @@
 import re
-import asyncio
-import aiohttp
 from datetime import datetime
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from utils.api import request
+from config import RESEND_CODE_DELAY
+from utils.api import request, get_session
 from utils.redis_client import set_customer_id, get_customer_id, clear_customer
 from utils.keyboards import (
     main_menu_reply_auth,
     main_menu_reply_unauth,
+    resend_code_kb,
 )
+from utils.timers import schedule_countdown
+from utils.fastpath import fast_path
 
 router = Router()
 
@@ -145,36 +147,15 @@ async def register_finish(message: Message, state: FSMContext):
 
         if sc_status in (200, 204):
             # Сообщение с таймером сразу после регистрации
-            kb = InlineKeyboardMarkup(
-                inline_keyboard=[[InlineKeyboardButton(text="🔄 Отправить код повторно (через 1:00)", callback_data="wait")]]
-            )
             msg = await message.answer(
                 "✅ Регистрация успешна!\n\n📞 Ответьте на звонок! Робот продиктует код.\n"
                 "Отправьте только 4 цифры из звонка.",
-                reply_markup=kb
+                reply_markup=resend_code_kb(RESEND_CODE_DELAY)
             )
+            # Обратный отсчёт ведёт общий сервис таймеров, хендлер не ждёт
+            await schedule_countdown(message.chat.id, msg.message_id, RESEND_CODE_DELAY)
 
-            # Обратный отсчёт
-            for remaining in range(50, 0, -10):
-                await asyncio.sleep(10)
-                try:
-                    kb = InlineKeyboardMarkup(
-                        inline_keyboard=[[InlineKeyboardButton(text=f"🔄 Отправить код повторно (через 0:{remaining:02d})", callback_data="wait")]]
-                    )
-                    await msg.edit_reply_markup(reply_markup=kb)
-                except Exception:
-                    break
-
-            # Активируем кнопку через 60 секунд
-            await asyncio.sleep(10)
-            kb_enabled = InlineKeyboardMarkup(
-                inline_keyboard=[[InlineKeyboardButton(text="🔄 Отправить код повторно", callback_data="resend_code")]]
-            )
-            try:
-                await msg.edit_reply_markup(reply_markup=kb_enabled)
-            except Exception:
-                pass
-                # 🔑 сразу после регистрации делаем скрытый login, чтобы получить куки
+        # 🔑 сразу после регистрации делаем скрытый login, чтобы получить куки
         login_status, login_resp = await request(
             message.chat.id,
             "POST",
@@ -240,6 +221,7 @@ async def login_finish(message: Message, state: FSMContext):
 
 # ===== Подтверждение кода (только 4 цифры) =====
 
+@fast_path.digits(4)
 @router.message(F.text.regexp(r"^\d{4}$"))
 async def confirm_code(message: Message):
     customer_id = await get_customer_id(message.chat.id)
@@ -283,10 +265,10 @@ async def resend_code(cb):
 async def logout_cmd(message: Message):
     # напрямую дергаем forfriends.space/api/_flush_cookies, минуя request()
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://forfriends.space/api/_flush_cookies") as resp:
-                status = resp.status
-                text = await resp.text()
+        session = await get_session()
+        async with session.get("https://forfriends.space/api/_flush_cookies") as resp:
+            status = resp.status
+            text = await resp.text()
     except Exception as e:
         status = 500
         text = str(e)
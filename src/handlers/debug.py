@@ -0,0 +1,30 @@
+from html import escape
+
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from config import ADMIN_IDS
+from utils.tracing import slowest_traces, format_trace
+
+router = Router()
+# команды только для администраторов, остальные апдейты идут дальше по роутерам
+router.message.filter(F.from_user.id.in_(ADMIN_IDS))
+
+
+# ===== /traces [n] — самые медленные недавние апдейты =====
+@router.message(Command("traces"))
+async def traces_cmd(message: Message, command: CommandObject):
+    try:
+        n = min(int(command.args or 5), 20)
+    except ValueError:
+        n = 5
+
+    traces = slowest_traces(n)
+    if not traces:
+        await message.answer("📭 Трейсов пока нет.")
+        return
+
+    for trace in traces:
+        # лимит сообщения Telegram — 4096 символов
+        await message.answer(f"<pre>{escape(format_trace(trace)[:3900])}</pre>")
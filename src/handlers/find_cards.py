@@ -1,4 +1,5 @@
-from aiogram import Router, F
+import logging
+from aiogram import Bot, Router, F
 from aiogram.filters import Command
 from aiogram.types import (
     Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton,
@@ -6,9 +7,14 @@ from aiogram.types import (
     ChosenInlineResult,
 )
 
+from config import INLINE_CACHE_TIME
 from utils.api import request, unwrap
+from utils.catalog import search_businesses, get_business_cards
 from utils.redis_client import get_customer_id
 from utils.keyboards import login_inline_kb
+from utils.fastpath import fast_path
+
+logger = logging.getLogger(__name__)
 
 router = Router()
 
@@ -35,18 +41,11 @@ async def inline_find(inline_query: InlineQuery):
         await inline_query.answer([], cache_time=1, is_personal=True)
         return
 
-    status, payload = await request(
-        inline_query.from_user.id, "GET", "/businesses/",
-        params={"q": q, "limit": 10, "offset": 0}
-    )
-    if status != 200:
+    businesses = await search_businesses(inline_query.from_user.id, q)
+    if businesses is None:
         await inline_query.answer([], cache_time=1, is_personal=True)
         return
 
-    businesses = unwrap(payload, as_list=True)
-    print("=== /businesses payload ===")
-    print(payload)
-
     results = []
     for b in businesses:
         bid = b.get("id")
@@ -61,58 +60,52 @@ async def inline_find(inline_query: InlineQuery):
                 input_message_content=InputTextMessageContent(message_text=f"/biz_{bid}"),
             )
         )
-    await inline_query.answer(results, cache_time=1, is_personal=True)
+    # выдача одинакова для всех — пусть Telegram кэширует её сам
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False)
+
+
+def business_cards_kb(cards: list) -> InlineKeyboardMarkup:
+    rows = []
+    for c in cards:
+        cid = c.get("id") or c.get("punch_card_id")
+        if not cid:
+            continue
+        title = c.get("name", "—")
+        # передаём только id в callback
+        cb = f"addcard:{cid}"
+        rows.append([InlineKeyboardButton(text=f"➕ {title}", callback_data=cb)])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
 # ===== Выбор inline-результата =====
 @router.chosen_inline_result()
-async def inline_chosen(chosen: ChosenInlineResult):
+async def inline_chosen(chosen: ChosenInlineResult, bot: Bot):
     business_id = chosen.result_id
     chat_id = chosen.from_user.id
 
-    status, payload = await request(
-        chat_id, "GET", f"/businesses/{business_id}/punch-cards/",
-        params={"limit": 50, "offset": 0}
-    )
-    print("=== /businesses/{id}/punch-cards payload ===")
-    print(payload)
+    status, cards = await get_business_cards(chat_id, business_id)
 
     if status == 403:
-        await router.bot.send_message(chat_id, "🔐 Сессия истекла. Войдите снова.", reply_markup=login_inline_kb())
+        await bot.send_message(chat_id, "🔐 Сессия истекла. Войдите снова.", reply_markup=login_inline_kb())
         return
     if status != 200:
-        await router.bot.send_message(chat_id, f"❌ Ошибка загрузки карточек (status={status}).")
+        await bot.send_message(chat_id, f"❌ Ошибка загрузки карточек (status={status}).")
         return
 
-    cards = unwrap(payload, as_list=True)
     if not cards:
-        await router.bot.send_message(chat_id, "📭 У этого заведения пока нет карточек.")
+        await bot.send_message(chat_id, "📭 У этого заведения пока нет карточек.")
         return
 
-    rows = []
-    for c in cards:
-        cid = c.get("id") or c.get("punch_card_id")
-        if not cid:
-            continue
-        title = c.get("name", "—")
-        # передаём только id в callback
-        cb = f"addcard:{cid}"
-        rows.append([InlineKeyboardButton(text=f"➕ {title}", callback_data=cb)])
-
-    kb = InlineKeyboardMarkup(inline_keyboard=rows)
-    await router.bot.send_message(chat_id, "🎴 Карточки заведения:\nВыберите, что добавить:", reply_markup=kb)
+    kb = business_cards_kb(cards)
+    await bot.send_message(chat_id, "🎴 Карточки заведения:\nВыберите, что добавить:", reply_markup=kb)
 
 
 # ===== Подстраховка на /biz_<id> =====
+@fast_path.prefix("/biz_")
 @router.message(F.text.startswith("/biz_"))
 async def show_business_cards(message: Message):
     business_id = message.text.replace("/biz_", "", 1)
-    status, payload = await request(
-        message.chat.id, "GET", f"/businesses/{business_id}/punch-cards/",
-        params={"limit": 50, "offset": 0}
-    )
-    print("=== /businesses/{id}/punch-cards payload ===")
-    print(payload)
+    status, cards = await get_business_cards(message.chat.id, business_id)
 
     if status == 403:
         await message.answer("🔐 Сессия истекла. Войдите снова.", reply_markup=login_inline_kb())
@@ -121,21 +114,11 @@ async def show_business_cards(message: Message):
         await message.answer(f"❌ Ошибка загрузки карточек (status={status}).")
         return
 
-    cards = unwrap(payload, as_list=True)
     if not cards:
         await message.answer("📭 У этого заведения пока нет карточек.")
         return
 
-    rows = []
-    for c in cards:
-        cid = c.get("id") or c.get("punch_card_id")
-        if not cid:
-            continue
-        title = c.get("name", "—")
-        cb = f"addcard:{cid}"
-        rows.append([InlineKeyboardButton(text=f"➕ {title}", callback_data=cb)])
-
-    kb = InlineKeyboardMarkup(inline_keyboard=rows)
+    kb = business_cards_kb(cards)
     await message.answer("🎴 Карточки заведения:\nВыберите, что добавить:", reply_markup=kb)
 
 
@@ -157,8 +140,6 @@ async def add_card(cb: CallbackQuery):
         return
 
     payload_json = {"punch_card_id": pcard_id}
-    print("=== [REQUEST] POST /customers/{}/cards/ ===".format(customer_id))
-    print("Payload:", payload_json)
 
     status, payload = await request(
         cb.message.chat.id,
@@ -167,9 +148,7 @@ async def add_card(cb: CallbackQuery):
         json=payload_json
     )
 
-    print("=== [RESPONSE] POST /customers/{}/cards/ ===".format(customer_id))
-    print("Status:", status)
-    print("Payload:", payload)
+    logger.debug("POST /customers/%s/cards/ %s -> %s %s", customer_id, payload_json, status, payload)
 
     if status == 403:
         await cb.message.answer("🔐 Сессия истекла. Войдите снова.", reply_markup=login_inline_kb())
@@ -1,11 +1,14 @@
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 
+from config import CARDS_PAGE_SIZE
 from utils.api import request, unwrap
-from utils.redis_client import get_customer_id
+from utils.redis_client import get_customer_id, get_qr_file_id, set_qr_file_id, clear_qr_file_id
 from utils.keyboards import login_inline_kb
-from utils.qr import make_qr_input_file
+from utils.qr import make_qr_input_file, QRBusyError
+from utils.progress import mark_active
 
 router = Router()
 
@@ -20,65 +23,87 @@ def make_progress_bar(current: int, total: int) -> str:
     return f"{filled}{empty} ({current}/{total})"
 
 
-# ===== Универсальная функция для вывода карточек =====
-async def mycards_cmd(message: Message):
-    customer_id = await get_customer_id(message.chat.id)
-    if not customer_id:
-        await message.answer("ℹ️ Сначала войдите.", reply_markup=login_inline_kb())
-        return
+def is_filled(current, total) -> bool:
+    return (
+        isinstance(current, int)
+        and isinstance(total, int)
+        and total > 0
+        and current >= total
+    )
+
 
+# ===== Страница списка карточек =====
+async def render_cards_page(chat_id: int, customer_id: str, page: int):
+    """
+    Одна страница /mycards: (status, text, kb).
+    Берём на одну карточку больше страницы, чтобы понять, есть ли следующая.
+    """
     status, payload = await request(
-        message.chat.id, "GET", f"/customers/{customer_id}/cards/", params={"limit": 100, "offset": 0}
+        chat_id, "GET", f"/customers/{customer_id}/cards/",
+        params={"limit": CARDS_PAGE_SIZE + 1, "offset": page * CARDS_PAGE_SIZE},
+        conditional=True,
+        retry=True,
     )
-    if status == 403:
-        await message.answer("🔐 Сессия истекла. Войдите снова.", reply_markup=login_inline_kb())
-        return
     if status != 200:
-        await message.answer(f"❌ Не удалось получить список карточек (status={status}).")
-        return
+        return status, None, None
+    # пользователь следит за карточками — фоновая проверка будет сообщать о наградах
+    await mark_active(chat_id)
 
     cards = unwrap(payload, as_list=True) or []
+    has_next = len(cards) > CARDS_PAGE_SIZE
+    cards = cards[:CARDS_PAGE_SIZE]
 
-    if not cards:
-        await message.answer("📭 У вас пока нет карточек.")
-        return
+    if not cards and page == 0:
+        return status, "📭 У вас пока нет карточек.", None
 
+    lines = [f"🎴 <b>Мои карты</b> · стр. {page + 1}"]
+    rows = []
     for c in cards:
         cid = c.get("id")
         card_name = c.get("name", "—")
         reward_name = c.get("reward_name") or "Награда"
         current = c.get("current_stamp_count")
         total = c.get("total_stamp_count")
-
         bar = make_progress_bar(current, total)
 
-        filled = (
-            isinstance(current, int)
-            and isinstance(total, int)
-            and total > 0
-            and current >= total
-        )
-
-        if filled:
-            # Сообщение о награде
-            text = f"🏆 <b>{reward_name}</b>\nКарта: {card_name}\nПрогресс: {bar}"
-            kb = InlineKeyboardMarkup(inline_keyboard=[[
-                InlineKeyboardButton(
-                    text=f"🎁 {reward_name}",
-                    callback_data=f"qr:redeem:{cid}"
-                )
-            ]])
+        if is_filled(current, total):
+            lines.append(f"🏆 <b>{card_name}</b> — {reward_name}\n{bar}")
+            rows.append([InlineKeyboardButton(text=f"🎁 {reward_name}", callback_data=f"qr:redeem:{cid}")])
         else:
-            # Сообщение о карте
-            text = f"🎴 <b>{card_name}</b>\nПрогресс: {bar}"
-            kb = InlineKeyboardMarkup(inline_keyboard=[[
-                InlineKeyboardButton(
-                    text=f"📲 {card_name}",
-                    callback_data=f"qr:stamp:{cid}"
-                )
-            ]])
+            lines.append(f"🎴 <b>{card_name}</b>\n{bar}")
+            rows.append([InlineKeyboardButton(text=f"📲 {card_name}", callback_data=f"qr:stamp:{cid}")])
+
+    if not cards:
+        lines.append("📭 На этой странице пусто.")
 
-        await message.answer(text, reply_markup=kb)
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"cards:page:{page - 1}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"cards:page:{page + 1}"))
+    if nav:
+        rows.append(nav)
+
+    return status, "\n\n".join(lines), InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+# ===== Универсальная функция для вывода карточек =====
+async def mycards_cmd(message: Message):
+    customer_id = await get_customer_id(message.chat.id)
+    if not customer_id:
+        await message.answer("ℹ️ Сначала войдите.", reply_markup=login_inline_kb())
+        return
+
+    status, text, kb = await render_cards_page(message.chat.id, customer_id, 0)
+    if status == 403:
+        await message.answer("🔐 Сессия истекла. Войдите снова.", reply_markup=login_inline_kb())
+        return
+    if status != 200:
+        await message.answer(f"❌ Не удалось получить список карточек (status={status}).")
+        return
+
+    # все карточки — одним сообщением, листание редактирует его на месте
+    await message.answer(text, reply_markup=kb)
 
 
 # ===== Команда /mycards =====
@@ -87,6 +112,38 @@ async def mycards_command_entry(message: Message):
     await mycards_cmd(message)
 
 
+# ===== Листание /mycards =====
+@router.callback_query(F.data.startswith("cards:page:"))
+async def cards_page(cb: CallbackQuery):
+    try:
+        page = max(0, int(cb.data.rsplit(":", 1)[1]))
+    except ValueError:
+        await cb.answer("Некорректные данные", show_alert=True)
+        return
+
+    customer_id = await get_customer_id(cb.message.chat.id)
+    if not customer_id:
+        await cb.message.answer("ℹ️ Сначала войдите.", reply_markup=login_inline_kb())
+        await cb.answer()
+        return
+
+    status, text, kb = await render_cards_page(cb.message.chat.id, customer_id, page)
+    if status == 403:
+        await cb.message.answer("🔐 Сессия истекла. Войдите снова.", reply_markup=login_inline_kb())
+        await cb.answer()
+        return
+    if status != 200:
+        await cb.answer(f"❌ Не удалось получить список карточек (status={status}).", show_alert=True)
+        return
+
+    try:
+        await cb.message.edit_text(text, reply_markup=kb)
+    except TelegramBadRequest:
+        # "message is not modified" — страница не изменилась
+        pass
+    await cb.answer()
+
+
 # ===== Коллбэк открытия карты =====
 @router.callback_query(F.data.startswith("card:open:"))
 async def open_card(cb: CallbackQuery):
@@ -102,7 +159,9 @@ async def open_card(cb: CallbackQuery):
         await cb.answer()
         return
 
-    status, payload = await request(cb.message.chat.id, "GET", f"/customers/{customer_id}/cards/{card_id}")
+    status, payload = await request(
+        cb.message.chat.id, "GET", f"/customers/{customer_id}/cards/{card_id}", conditional=True, retry=True
+    )
     if status == 403:
         await cb.message.answer("🔐 Сессия истекла. Войдите снова.", reply_markup=login_inline_kb())
         await cb.answer()
@@ -122,12 +181,7 @@ async def open_card(cb: CallbackQuery):
 
     text = f"🪪 <b>{card_name}</b>\nПрогресс: {bar}"
 
-    filled = (
-        isinstance(current, int)
-        and isinstance(total, int)
-        and total > 0
-        and current >= total
-    )
+    filled = is_filled(current, total)
 
     kb = InlineKeyboardMarkup(inline_keyboard=[[
         InlineKeyboardButton(
@@ -156,10 +210,30 @@ async def send_qr(cb: CallbackQuery):
         await cb.answer()
         return
 
+    if action == "stamp":
+        # после штампа прогресс вот-вот изменится
+        await mark_active(cb.message.chat.id)
+
     # 🔗 Формируем полный URL для QR
     qr_text = f"https://api.forfriends.space/api/v1/customers/{customer_id}/cards/{card_id}/{action}"
-    file = make_qr_input_file(qr_text, filename=f"{action}.png")
-
     caption = "✅ Штамп начислен" if action == "stamp" else "🎁 Награда доступна"
-    await cb.message.answer_photo(photo=file, caption=caption)
+
+    # ♻️ Уже загружали этот QR — отправляем по file_id, без рендера и аплоада
+    file_id = await get_qr_file_id(qr_text)
+    if file_id:
+        try:
+            await cb.message.answer_photo(photo=file_id, caption=caption)
+            await cb.answer()
+            return
+        except TelegramBadRequest:
+            await clear_qr_file_id(qr_text)
+
+    try:
+        file = await make_qr_input_file(qr_text, filename=f"{action}.png")
+    except QRBusyError:
+        await cb.answer("⏳ Слишком много запросов, нажмите ещё раз через пару секунд.", show_alert=True)
+        return
+    msg = await cb.message.answer_photo(photo=file, caption=caption)
+    if msg.photo:
+        await set_qr_file_id(qr_text, msg.photo[-1].file_id)
     await cb.answer()
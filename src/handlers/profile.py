@@ -15,7 +15,7 @@ async def profile_cmd(message: Message):
         await message.answer("ℹ️ Сначала войдите.", reply_markup=login_inline_kb())
         return
 
-    status, payload = await request(message.chat.id, "GET", f"/customers/{customer_id}/")
+    status, payload = await request(message.chat.id, "GET", f"/customers/{customer_id}/", conditional=True, retry=True)
     if status == 403:
         await message.answer("🔐 Сессия истекла. Войдите снова.", reply_markup=login_inline_kb())
         return
@@ -9,6 +9,7 @@ from utils.keyboards import (
     main_menu_reply_unauth,
 )
 from utils.redis_client import get_customer_id
+from utils.fastpath import fast_path
 
 # импортируем старты FSM логина и регистрации
 from handlers.auth import login_start, register_start
@@ -35,17 +36,21 @@ async def start_cmd(message: Message):
 
 
 # ===== Reply keyboard actions =====
+# точные тексты кнопок идут ещё и в таблицу fast_path (см. utils/fastpath.py)
 
+@fast_path.text("🎴 Мои карты")
 @router.message(F.text == "🎴 Мои карты")
 async def reply_cards(message: Message):
     # вместо "отправить /mycards" вызываем хендлер
     await mycards_cmd(message)
 
+@fast_path.text("👤 Профиль")
 @router.message(F.text == "👤 Профиль")
 async def reply_profile(message: Message):
     # вместо "отправить /me" вызываем хендлер
     await profile_cmd(message)
 
+@fast_path.text("🔎 Найти заведение")
 @router.message(F.text == "🔎 Найти заведение")
 async def reply_find(message: Message):
     await message.answer(
@@ -55,10 +60,12 @@ async def reply_find(message: Message):
 
 # ===== Вход и регистрация =====
 
+@fast_path.text("🔐 Войти")
 @router.message(F.text == "🔐 Войти")
 async def reply_login(message: Message, state: FSMContext):
     await login_start(message, state)
 
+@fast_path.text("📝 Регистрация")
 @router.message(F.text == "📝 Регистрация")
 async def reply_register(message: Message, state: FSMContext):
     await register_start(message, state)
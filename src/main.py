@@ -1,26 +1,147 @@
 import asyncio
+import logging
+from aiohttp import web
 from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from config import BOT_TOKEN, DEFAULT_BOT_PROPS
+from config import (
+    BOT_TOKEN, DEFAULT_BOT_PROPS,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, TELEGRAM_SECRET, WEBAPP_HOST, WEBAPP_PORT,
+    METRICS_ENABLED, METRICS_PATH, FAST_PATH, STREAM_INGEST,
+)
+from utils.api import init_http, close_http
+from utils.redis_client import make_fsm_storage
+from utils.qr import shutdown_qr_executor
+from utils.catalog import start_catalog_sync, stop_catalog_sync
+from utils.throttle import send_scheduler
+from utils.timers import start_timers, stop_timers
+from utils.progress import start_progress_watcher, stop_progress_watcher
+from utils.metrics import setup_metrics, metrics_handler
+from utils.tracing import setup_tracing
+from utils.recorder import setup_recorder
+from utils.fastpath import fast_path
+from utils.concurrency import setup_limiter
+from utils.streams import setup_stream_ingest
 from handlers import (
     start as start_handlers,
     auth as auth_handlers,
     profile as profile_handlers,
     find_cards as find_cards_handlers,
     mycards as mycards_handlers,
+    debug as debug_handlers,
 )
 
-async def main():
-    bot = Bot(token=BOT_TOKEN, default=DEFAULT_BOT_PROPS)
-    dp = Dispatcher()
+def build_dispatcher() -> Dispatcher:
+    dp = Dispatcher(storage=make_fsm_storage())
+    # общий лимит одновременных апдейтов и очередь на чат
+    setup_limiter(dp)
 
+    dp.include_router(debug_handlers.router)
     dp.include_router(start_handlers.router)
     dp.include_router(auth_handlers.router)
     dp.include_router(profile_handlers.router)
     dp.include_router(find_cards_handlers.router)
     dp.include_router(mycards_handlers.router)
+    if FAST_PATH:
+        fast_path.install(dp)
+
+    # общий HTTP-пул к API живёт всё время работы бота
+    dp.startup.register(init_http)
+    dp.shutdown.register(close_http)
+    dp.shutdown.register(shutdown_qr_executor)
+    # каталог заведений для inline-поиска синхронизируется в фоне
+    dp.startup.register(start_catalog_sync)
+    dp.shutdown.register(stop_catalog_sync)
+    dp.startup.register(start_timers)
+    dp.shutdown.register(stop_timers)
+    # уведомления «награда готова» по изменениям прогресса карточек
+    dp.startup.register(start_progress_watcher)
+    dp.shutdown.register(stop_progress_watcher)
+    return dp
+
+# ===== HTTP =====
+
+async def serve(app: web.Application, port: int = WEBAPP_PORT):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBAPP_HOST, port).start()
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+def build_web_app() -> web.Application:
+    app = web.Application()
+    if METRICS_ENABLED:
+        app.router.add_get(METRICS_PATH, metrics_handler)
+    return app
+
+# ===== Webhook =====
+
+async def run_webhook(bot: Bot, dp: Dispatcher, allowed_updates: list[str] | None = None):
+    # без секрета эндпоинт примет апдейт от кого угодно — не стартуем
+    if not WEBHOOK_URL or not TELEGRAM_SECRET:
+        raise RuntimeError("webhook mode requires WEBHOOK_URL and TELEGRAM_SECRET")
+
+    async def set_webhook(bot: Bot):
+        await bot.set_webhook(
+            WEBHOOK_URL,
+            secret_token=TELEGRAM_SECRET,
+            allowed_updates=allowed_updates or dp.resolve_used_update_types(),
+        )
+
+    dp.startup.register(set_webhook)
+
+    app = build_web_app()
+    # handle_in_background: Telegram сразу получает 200, апдейт обрабатывается отдельной задачей
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=TELEGRAM_SECRET,
+        handle_in_background=True,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    await serve(app)
+
+# ===== Polling =====
+
+async def run_polling(bot: Bot, dp: Dispatcher, allowed_updates: list[str] | None = None):
+    allowed_updates = allowed_updates or dp.resolve_used_update_types()
+    # если раньше работали через webhook, getUpdates без этого не заработает
+    await bot.delete_webhook()
+    if not METRICS_ENABLED:
+        await dp.start_polling(bot, allowed_updates=allowed_updates)
+        return
+    # /metrics отдаём с того же порта, что и в webhook-режиме
+    metrics_task = asyncio.create_task(serve(build_web_app()))
+    try:
+        await dp.start_polling(bot, allowed_updates=allowed_updates)
+    finally:
+        metrics_task.cancel()
+
+async def main():
+    bot = Bot(token=BOT_TOKEN, default=DEFAULT_BOT_PROPS)
+    # все исходящие сообщения проходят через общий планировщик лимитов
+    bot.session.middleware(send_scheduler)
+    dp = build_dispatcher()
+    allowed_updates = dp.resolve_used_update_types()
+    if STREAM_INGEST:
+        # этот процесс только принимает апдейты и кладёт их в Redis Streams,
+        # обрабатывают их процессы worker.py; типы апдейтов — от полного набора роутеров.
+        # Хранилище FSM то же, что у воркеров: запись апдейтов редактирует ввод по raw_state
+        dp = Dispatcher(storage=make_fsm_storage())
+    if METRICS_ENABLED:
+        setup_metrics(dp, bot)
+    setup_tracing(dp, bot)
+    setup_recorder(dp)
+    if STREAM_INGEST:
+        setup_stream_ingest(dp)
 
-    await dp.start_polling(bot)
+    if BOT_MODE == "webhook":
+        await run_webhook(bot, dp, allowed_updates)
+    else:
+        await run_polling(bot, dp, allowed_updates)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(main())
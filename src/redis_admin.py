@@ -0,0 +1,122 @@
+"""
+Обслуживание Redis бота.
+
+    python redis_admin.py report [--match "session:*"] [--sample 1000]
+    python redis_admin.py migrate
+
+report  — число ключей, память (MEMORY USAGE) и ключи без TTL по семействам
+          (семейство — часть имени до первого двоеточия: session, fsm, qr_file, ...).
+migrate — переносит старые строки customer_id:{chat_id} / cookies:{chat_id}
+          в hash session:{chat_id}. Запускать один раз перед выкладкой: бот по умолчанию
+          (SESSION_MIGRATE_LEGACY=0) старые ключи не читает.
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+
+from redis.exceptions import ResponseError
+
+from utils.redis_client import redis, migrate_legacy_session
+
+SCAN_BATCH = 1000
+
+
+def _family(key: str) -> str:
+    return key.split(":", 1)[0] if ":" in key else key
+
+
+def _human(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+async def report(match: str, sample: int):
+    keys = defaultdict(int)
+    no_ttl = defaultdict(int)
+    measured = defaultdict(int)
+    memory = defaultdict(int)
+    memory_supported = True
+
+    async for key in redis.scan_iter(match=match, count=SCAN_BATCH):
+        family = _family(key)
+        keys[family] += 1
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.ttl(key)
+            if memory_supported and measured[family] < sample:
+                pipe.memory_usage(key)
+            try:
+                result = await pipe.execute()
+            except ResponseError:
+                # MEMORY USAGE недоступна (старый Redis или совместимый сервер)
+                memory_supported = False
+                result = [await redis.ttl(key)]
+        if result[0] == -1:
+            no_ttl[family] += 1
+        if len(result) > 1 and result[1] is not None:
+            measured[family] += 1
+            memory[family] += result[1]
+
+    if not keys:
+        print("ключей не найдено")
+        return
+
+    print(f"{'family':<16}{'keys':>10}{'no ttl':>10}{'memory':>14}{'avg':>12}")
+    total_keys = total_memory = 0
+    for family in sorted(keys, key=keys.get, reverse=True):
+        count = keys[family]
+        total_keys += count
+        if measured[family]:
+            avg = memory[family] / measured[family]
+            # при выборке экстраполируем на всё семейство
+            estimate = int(avg * count)
+            total_memory += estimate
+            mem, avg_s = _human(estimate), _human(int(avg))
+        else:
+            mem = avg_s = "—"
+        print(f"{family:<16}{count:>10}{no_ttl[family]:>10}{mem:>14}{avg_s:>12}")
+    total_mem = _human(total_memory) if any(measured.values()) else "—"
+    print(f"{'total':<16}{total_keys:>10}{sum(no_ttl.values()):>10}{total_mem:>14}")
+
+
+async def migrate():
+    chats = set()
+    for pattern in ("customer_id:*", "cookies:*"):
+        async for key in redis.scan_iter(match=pattern, count=SCAN_BATCH):
+            _, _, chat_id = key.partition(":")
+            if chat_id.lstrip("-").isdigit():
+                chats.add(int(chat_id))
+
+    migrated = 0
+    for chat_id in chats:
+        if await migrate_legacy_session(chat_id):
+            migrated += 1
+    print(f"перенесено сессий: {migrated} из {len(chats)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание Redis бота")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_report = sub.add_parser("report", help="ключи и память по семействам")
+    p_report.add_argument("--match", default="*", help="шаблон SCAN MATCH")
+    p_report.add_argument("--sample", type=int, default=1000,
+                          help="сколько ключей семейства замерять через MEMORY USAGE")
+    sub.add_parser("migrate", help="перенести старые ключи сессий в session:{chat_id}")
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            if args.command == "report":
+                await report(args.match, args.sample)
+            else:
+                await migrate()
+        finally:
+            await redis.aclose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
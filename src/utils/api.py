@@ -1,36 +1,303 @@
+import asyncio
+import logging
+import random
+import time
 import aiohttp
 from http.cookies import SimpleCookie
 from typing import Any, Dict, Tuple
-from config import API_BASE
-from .redis_client import get_cookies_raw, set_cookies_raw
-
-def _raw_to_cookiejar(raw: str | None) -> aiohttp.CookieJar:
-    jar = aiohttp.CookieJar()
-    if raw:
-        sc = SimpleCookie(); sc.load(raw)
-        jar.update_cookies({k: m.value for k, m in sc.items()})
-    return jar
-
-def _cookiejar_to_raw(jar: aiohttp.CookieJar) -> str:
-    pairs = [f"{c.key}={c.value}" for c in jar]
+from config import (
+    API_BASE,
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_DNS_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+    API_TIMEOUT,
+    API_CONNECT_TIMEOUT,
+    API_TIMEOUTS,
+    API_RETRIES,
+    API_RETRY_BACKOFF,
+    API_BREAKER_THRESHOLD,
+    API_BREAKER_RESET,
+    HTTP_CACHE_MAX_BODY,
+)
+from .cache import SingleFlight
+from .redis_client import (
+    get_cookies_raw, set_cookies_raw, peek_session, update_cookies_raw, get_http_cache, set_http_cache,
+)
+from .metrics import API_SECONDS, API_RESPONSES, API_RETRIES as API_RETRIES_TOTAL, API_BREAKER_OPEN, path_template
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+UNAVAILABLE = "Сервис временно недоступен, попробуйте чуть позже."
+
+# Один ClientSession на процесс: keep-alive пул и кэш DNS.
+# Куки у каждого чата свои, поэтому общий jar не используем —
+# подставляем их заголовком Cookie в каждый запрос.
+_session: aiohttp.ClientSession | None = None
+
+async def init_http() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+    return _session
+
+async def close_http():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+async def get_session() -> aiohttp.ClientSession:
+    """Общая сессия; создаётся лениво, если init_http() ещё не вызывали."""
+    if _session is None or _session.closed:
+        return await init_http()
+    return _session
+
+def _raw_to_cookies(raw: str | None) -> Dict[str, str]:
+    if not raw:
+        return {}
+    sc = SimpleCookie(); sc.load(raw)
+    return {k: m.value for k, m in sc.items()}
+
+def _cookies_to_raw(cookies: Dict[str, str]) -> str:
+    pairs = [f"{k}={v}" for k, v in cookies.items()]
     return "; ".join(pairs)
 
+def _merge_response_cookies(cookies: Dict[str, str], resp: aiohttp.ClientResponse) -> Dict[str, str]:
+    merged = dict(cookies)
+    for key, morsel in resp.cookies.items():
+        # сервер удаляет куку пустым значением или max-age=0
+        if not morsel.value or morsel["max-age"] == "0":
+            merged.pop(key, None)
+        else:
+            merged[key] = morsel.value
+    return merged
+
+# ===== Устойчивость: таймауты, повторы, circuit breaker =====
+
+class CircuitBreaker:
+    """
+    После threshold подряд неудач (таймаут, сетевая ошибка, 5xx) размыкается на
+    reset_after секунд и запросы сразу получают 503. Затем пропускает один пробный
+    запрос: успех замыкает цепь, неудача — снова размыкает.
+    """
+
+    def __init__(self, threshold: int, reset_after: float):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probe = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self._probe and time.monotonic() - self.opened_at >= self.reset_after:
+            self._probe = True
+            return True
+        return False
+
+    def success(self):
+        if self.opened_at is not None:
+            logger.info("API circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probe = False
+
+    def release(self):
+        """Пробный запрос прерван (отмена апдейта): пропустить следующий, не меняя счётчиков."""
+        self._probe = False
+
+    def failure(self):
+        self.failures += 1
+        if self._probe or (self.opened_at is None and self.failures >= self.threshold):
+            if self.opened_at is None:
+                logger.warning("API circuit opened after %d failures", self.failures)
+            self.opened_at = time.monotonic()
+            self._probe = False
+
+breaker = CircuitBreaker(API_BREAKER_THRESHOLD, API_BREAKER_RESET)
+API_BREAKER_OPEN.set_function(lambda: 1 if breaker.is_open else 0)
+
+def _timeout_for(path: str) -> aiohttp.ClientTimeout:
+    total = API_TIMEOUT
+    for prefix, seconds in API_TIMEOUTS.items():
+        if path.startswith(prefix):
+            total = seconds
+            break
+    return aiohttp.ClientTimeout(total=total, connect=min(API_CONNECT_TIMEOUT, total))
+
+def _backoff(attempt: int) -> float:
+    # full jitter: равномерно от 0 до base * 2^attempt
+    return random.uniform(0, API_RETRY_BACKOFF * (2 ** attempt))
+
+# Одинаковые одновременные GET к общим (не персональным) эндпоинтам
+_inflight = SingleFlight()
+
 async def request(
-    chat_id: int, method: str, path: str,
+    chat_id: int | None, method: str, path: str,
     *, params: Dict[str, Any] | None = None,
     json: Dict[str, Any] | None = None,
+    shared: bool = False,
+    conditional: bool = False,
+    retry: bool = False,
+    touch_session: bool = True,
 ) -> Tuple[int, Any]:
-    cookie_raw = await get_cookies_raw(chat_id)
-    jar = _raw_to_cookiejar(cookie_raw)
-    async with aiohttp.ClientSession(cookie_jar=jar) as session:
-        url = f"{API_BASE.rstrip('/')}/{path.lstrip('/')}"
-        async with session.request(method.upper(), url, params=params, json=json) as resp:
-            await set_cookies_raw(chat_id, _cookiejar_to_raw(session.cookie_jar))
+    """
+    chat_id=None — анонимный запрос: без кук чата и без их сохранения.
+    shared=True — публичный эндпоинт, ответ не зависит от пользователя: запрос
+    уходит анонимно (chat_id не используется, Set-Cookie никому не пишется),
+    одновременные одинаковые GET (путь, params) склеиваются в один, все получают
+    один и тот же payload (его нельзя менять на месте).
+    conditional=True — GET с If-None-Match / If-Modified-Since по сохранённому
+    ответу этого чата; на 304 возвращается (200, сохранённое тело).
+    retry=True — GET повторяется до API_RETRIES раз на таймаут, сетевую ошибку и 5xx.
+    Только для чтений без побочных эффектов (подтверждение кода — не такое).
+    Худшее время ответа тогда (API_RETRIES + 1) × таймаут пути плюс паузы backoff.
+    touch_session=False — для фоновых задач: куки читаются мимо кэша горячих сессий,
+    TTL сессии не продлевается, новые куки пишутся только в существующую сессию.
+    Сетевые ошибки и таймауты не бросаются наружу: вернётся (503/504, текст).
+    """
+    method = method.upper()
+    template = path_template(path)
+    with span(f"api {method} {template}") as attrs:
+        if shared and method == "GET":
+            key = (path, tuple(sorted((params or {}).items())))
+            attrs["shared"] = key in _inflight
+            status, payload = await _inflight.do(
+                key, lambda: _request_with_retries(None, method, path, template, params=params, json=None, retry=retry)
+            )
+        else:
+            status, payload = await _request_with_retries(
+                chat_id, method, path, template, params=params, json=json,
+                conditional=conditional and method == "GET" and chat_id is not None,
+                retry=retry, touch_session=touch_session,
+            )
+        attrs["status"] = status
+        return status, payload
+
+async def _request_with_retries(
+    chat_id: int | None, method: str, path: str, template: str,
+    *, params: Dict[str, Any] | None,
+    json: Dict[str, Any] | None,
+    conditional: bool = False,
+    retry: bool = False,
+    touch_session: bool = True,
+) -> Tuple[int, Any]:
+    if not breaker.allow():
+        return 503, UNAVAILABLE
+
+    timeout = _timeout_for(path)
+    # повторяем только GET, которые вызывающий явно отметил как безопасные
+    attempts = API_RETRIES + 1 if retry and method == "GET" else 1
+    for attempt in range(attempts):
+        last = attempt == attempts - 1
+        try:
+            status, payload = await _request(
+                chat_id, method, path, template,
+                params=params, json=json, timeout=timeout, conditional=conditional,
+                touch_session=touch_session,
+            )
+        except asyncio.TimeoutError:
+            breaker.failure()
+            status, payload = 504, UNAVAILABLE
+        except aiohttp.ClientError as e:
+            breaker.failure()
+            logger.warning("API %s %s failed: %r", method, template, e)
+            status, payload = 503, UNAVAILABLE
+        except Exception:
+            # непредвиденная ошибка не должна оставить breaker в полуоткрытом состоянии навсегда
+            breaker.failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        else:
+            if status < 500:
+                breaker.success()
+                return status, payload
+            breaker.failure()
+
+        if last or not breaker.allow():
+            return status, payload
+        API_RETRIES_TOTAL.labels(method, template).inc()
+        await asyncio.sleep(_backoff(attempt))
+    return status, payload
+
+async def _request(
+    chat_id: int | None, method: str, path: str, template: str,
+    *, params: Dict[str, Any] | None,
+    json: Dict[str, Any] | None,
+    timeout: aiohttp.ClientTimeout,
+    conditional: bool = False,
+    touch_session: bool = True,
+) -> Tuple[int, Any]:
+    if chat_id is None:
+        cookie_raw = None
+    elif touch_session:
+        cookie_raw = await get_cookies_raw(chat_id)
+    else:
+        _, cookie_raw = await peek_session(chat_id)
+    cookies = _raw_to_cookies(cookie_raw)
+    headers = {"Cookie": _cookies_to_raw(cookies)} if cookies else {}
+
+    cached = None
+    if conditional:
+        cache_key = _cache_key(path, params)
+        cached = await get_http_cache(chat_id, cache_key)
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+    session = await get_session()
+    url = f"{API_BASE.rstrip('/')}/{path.lstrip('/')}"
+    started = time.perf_counter()
+    status = "error"
+    try:
+        async with session.request(method, url, params=params, json=json, headers=headers or None, timeout=timeout) as resp:
+            status = resp.status
+            # пишем в Redis только если сервер действительно поменял куки
+            new_raw = _cookies_to_raw(_merge_response_cookies(cookies, resp))
+            if chat_id is not None and new_raw != (cookie_raw or ""):
+                await (set_cookies_raw if touch_session else update_cookies_raw)(chat_id, new_raw)
+            if resp.status == 304 and cached is not None:
+                return 200, cached["body"]
             try:
                 payload = await resp.json(content_type=None)
             except Exception:
                 payload = await resp.text()
+            if conditional and resp.status == 200:
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+                if (etag or last_modified) and len(await resp.read()) <= HTTP_CACHE_MAX_BODY:
+                    await set_http_cache(chat_id, cache_key, {
+                        "etag": etag, "last_modified": last_modified, "body": payload,
+                    })
             return resp.status, payload
+    finally:
+        API_SECONDS.labels(method, template).observe(time.perf_counter() - started)
+        API_RESPONSES.labels(method, template, str(status)).inc()
+
+def _cache_key(path: str, params: Dict[str, Any] | None) -> str:
+    if not params:
+        return path
+    return path + "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
 
 def unwrap(payload: Any, *, as_list: bool = False):
     """
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Небольшой in-process кэш: LRU с ограничением размера и временем жизни записей.
+    ttl=None — записи живут, пока их не вытеснят.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SingleFlight:
+    """
+    Склеивает одновременные вызовы с одним ключом: выполняется одна корутина,
+    остальные ждут её результат. Отмена одного ожидающего не отменяет запрос.
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+class SWRCache:
+    """
+    stale-while-revalidate: свежие записи (моложе fresh_ttl) отдаются как есть,
+    устаревшие (до stale_ttl) отдаются сразу, а обновляются в фоне.
+    Одновременные загрузки одного ключа склеиваются через SingleFlight.
+    """
+
+    def __init__(self, maxsize: int, fresh_ttl: float, stale_ttl: float):
+        self.fresh_ttl = fresh_ttl
+        self._entries = TTLCache(maxsize=maxsize, ttl=stale_ttl)
+        self._flight = SingleFlight()
+        self._background: set[asyncio.Task] = set()
+
+    async def get(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]],
+        *, cacheable: Callable[[Any], bool] = lambda _: True,
+    ) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            fetched_at, value = entry
+            if time.monotonic() - fetched_at > self.fresh_ttl and key not in self._flight:
+                task = asyncio.ensure_future(self._load(key, fetch, cacheable))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return value
+        return await self._load(key, fetch, cacheable)
+
+    async def _load(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool]) -> Any:
+        async def fetch_and_store():
+            value = await fetch()
+            if cacheable(value):
+                self._entries.set(key, (time.monotonic(), value))
+            return value
+        return await self._flight.do(key, fetch_and_store)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key)
@@ -0,0 +1,294 @@
+import asyncio
+import heapq
+import logging
+import re
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Set
+
+from config import (
+    SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_CACHE_REDIS,
+    CATALOG_INDEX, CATALOG_SYNC_INTERVAL,
+    PUNCH_CARDS_CACHE_SIZE, PUNCH_CARDS_FRESH_TTL, PUNCH_CARDS_STALE_TTL,
+)
+from .api import request, unwrap
+from .cache import TTLCache, SWRCache
+from .redis_client import get_cached_search, set_cached_search
+
+logger = logging.getLogger(__name__)
+
+# Каталог заведений общий для всех, поэтому результаты поиска
+# кэшируем по запросу, а не по пользователю.
+_search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+
+def normalize_query(q: str) -> str:
+    return " ".join(q.lower().split())
+
+def _compact(businesses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # для inline-ответа нужны только id и name
+    return [
+        {"id": b.get("id"), "name": b.get("name", "—")}
+        for b in businesses if b.get("id")
+    ]
+
+# ===== Локальный индекс каталога =====
+
+# "rjatqyz" → "кофейня": запрос набран в английской раскладке
+_LAT = "qwertyuiop[]asdfghjkl;'zxcvbnm,.`"
+_CYR = "йцукенгшщзхъфывапролджэячсмитьбюё"
+_LAYOUT = str.maketrans(_LAT, _CYR)
+_WORD = re.compile(r"\w+")
+MAX_PREFIX = 12
+
+def _tokens(text: str) -> List[str]:
+    return _WORD.findall(text.lower().replace("ё", "е"))
+
+def _trigrams(token: str) -> Set[str]:
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+class CatalogIndex:
+    """
+    Индекс названий заведений в памяти: префиксы слов (до MAX_PREFIX символов)
+    и триграммы для поиска по подстроке. Обновляется инкрементально:
+    переиндексируются только добавленные, изменённые и удалённые заведения.
+    """
+
+    def __init__(self):
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._tokens: Dict[str, List[str]] = {}
+        self._prefix: Dict[str, Set[str]] = defaultdict(set)
+        self._trigram: Dict[str, Set[str]] = defaultdict(set)
+        self.ready = False
+        self.synced_at: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _index(self, bid: str, tokens: List[str]):
+        for tok in tokens:
+            for i in range(1, min(len(tok), MAX_PREFIX) + 1):
+                self._prefix[tok[:i]].add(bid)
+            for tg in _trigrams(tok):
+                self._trigram[tg].add(bid)
+
+    def _unindex(self, bid: str, tokens: List[str]):
+        for tok in tokens:
+            for i in range(1, min(len(tok), MAX_PREFIX) + 1):
+                ids = self._prefix.get(tok[:i])
+                if ids is not None:
+                    ids.discard(bid)
+                    if not ids:
+                        del self._prefix[tok[:i]]
+            for tg in _trigrams(tok):
+                ids = self._trigram.get(tg)
+                if ids is not None:
+                    ids.discard(bid)
+                    if not ids:
+                        del self._trigram[tg]
+
+    def upsert(self, doc: Dict[str, Any]) -> bool:
+        bid = doc["id"]
+        old = self._docs.get(bid)
+        if old == doc:
+            return False
+        if old is not None:
+            self._unindex(bid, self._tokens[bid])
+        tokens = _tokens(doc.get("name", ""))
+        self._docs[bid] = doc
+        self._tokens[bid] = tokens
+        self._index(bid, tokens)
+        return True
+
+    def remove(self, bid: str):
+        if bid in self._docs:
+            self._unindex(bid, self._tokens.pop(bid))
+            del self._docs[bid]
+
+    def sync(self, docs: Iterable[Dict[str, Any]]) -> tuple[int, int]:
+        """Приводит индекс к полному списку docs. Возвращает (изменено, удалено)."""
+        seen = set()
+        changed = 0
+        for doc in docs:
+            seen.add(doc["id"])
+            changed += self.upsert(doc)
+        stale = [bid for bid in self._docs if bid not in seen]
+        for bid in stale:
+            self.remove(bid)
+        self.ready = True
+        self.synced_at = time.time()
+        return changed, len(stale)
+
+    def _match_token(self, tok: str) -> Set[str]:
+        if len(tok) <= MAX_PREFIX:
+            ids = self._prefix.get(tok)
+            if ids:
+                return ids
+        else:
+            ids = {
+                bid for bid in self._prefix.get(tok[:MAX_PREFIX], ())
+                if any(t.startswith(tok) for t in self._tokens[bid])
+            }
+            if ids:
+                return ids
+        # префикс не нашёлся — ищем по подстроке через триграммы
+        grams = _trigrams(tok)
+        if not grams:
+            return set()
+        ids = set.intersection(*(self._trigram.get(g, set()) for g in grams))
+        return {bid for bid in ids if any(tok in t for t in self._tokens[bid])}
+
+    def _search_tokens(self, tokens: List[str]) -> Set[str]:
+        result: Set[str] | None = None
+        for tok in tokens:
+            ids = self._match_token(tok)
+            result = set(ids) if result is None else result & ids
+            if not result:
+                return set()
+        return result or set()
+
+    def _rank(self, bid: str, first: str) -> tuple:
+        # сначала те, чьё название начинается с первого слова запроса
+        toks = self._tokens[bid]
+        starts = bool(toks) and toks[0].startswith(first)
+        return (not starts, self._docs[bid].get("name", "").lower())
+
+    def search(self, q: str, limit: int = 10) -> List[Dict[str, Any]]:
+        tokens = _tokens(q)
+        if not tokens:
+            return []
+        ids = self._search_tokens(tokens)
+        if not ids:
+            tokens = _tokens(q.lower().translate(_LAYOUT))
+            ids = self._search_tokens(tokens)
+        best = heapq.nsmallest(limit, ids, key=lambda bid: self._rank(bid, tokens[0]))
+        return [self._docs[bid] for bid in best]
+
+catalog = CatalogIndex()
+
+# страховка от API, который игнорирует offset и отдаёт одну и ту же страницу
+CATALOG_MAX_PAGES = 1000
+
+async def fetch_catalog(page_size: int = 100) -> List[Dict[str, Any]] | None:
+    """
+    Полный список заведений постранично. None, если API ответил ошибкой.
+    Конец — только пустая страница: API может урезать limit, и короткая
+    страница ещё не значит, что заведения кончились.
+    """
+    items: List[Dict[str, Any]] = []
+    offset = 0
+    for _ in range(CATALOG_MAX_PAGES):
+        status, payload = await request(
+            None, "GET", "/businesses/",
+            params={"limit": page_size, "offset": offset},
+            shared=True,
+            retry=True,
+        )
+        if status != 200:
+            return None
+        page = unwrap(payload, as_list=True)
+        if not page:
+            return items
+        items.extend(_compact(page))
+        offset += len(page)
+    logger.warning("catalog sync stopped after %d pages (%d businesses)", CATALOG_MAX_PAGES, len(items))
+    return items
+
+async def refresh_catalog():
+    docs = await fetch_catalog()
+    if docs is None:
+        logger.warning("catalog sync failed, keeping %d cached businesses", len(catalog))
+        return
+    if len(catalog) and len(docs) < len(catalog) // 2:
+        logger.warning("catalog shrank from %d to %d businesses", len(catalog), len(docs))
+    changed, removed = catalog.sync(docs)
+    if changed or removed:
+        logger.info("catalog synced: %d total, %d changed, %d removed", len(catalog), changed, removed)
+
+async def _sync_loop():
+    while True:
+        try:
+            await refresh_catalog()
+        except Exception:
+            logger.exception("catalog sync crashed")
+        await asyncio.sleep(CATALOG_SYNC_INTERVAL)
+
+_sync_task: asyncio.Task | None = None
+
+async def start_catalog_sync():
+    global _sync_task
+    if CATALOG_INDEX and _sync_task is None:
+        _sync_task = asyncio.create_task(_sync_loop())
+
+async def stop_catalog_sync():
+    global _sync_task
+    if _sync_task is not None:
+        _sync_task.cancel()
+        _sync_task = None
+
+# ===== Поиск =====
+
+async def search_businesses(chat_id: int, q: str, *, limit: int = 10) -> List[Dict[str, Any]] | None:
+    """
+    Заведения по запросу: локальный индекс, а пока он не готов —
+    память → Redis → API. None, если API ответил ошибкой.
+    """
+    if catalog.ready:
+        return catalog.search(q, limit)
+
+    key = normalize_query(q)
+    items = _search_cache.get(key)
+    if items is not None:
+        return items
+
+    if SEARCH_CACHE_REDIS:
+        items = await get_cached_search(key)
+        if items is not None:
+            _search_cache.set(key, items)
+            return items
+
+    status, payload = await request(
+        chat_id, "GET", "/businesses/",
+        params={"q": key, "limit": limit, "offset": 0},
+        shared=True,
+        retry=True,
+    )
+    if status != 200:
+        return None
+
+    items = _compact(unwrap(payload, as_list=True))
+    _search_cache.set(key, items)
+    if SEARCH_CACHE_REDIS:
+        await set_cached_search(key, items, SEARCH_CACHE_TTL)
+    return items
+
+# ===== Карточки заведения =====
+
+_punch_cards = SWRCache(
+    maxsize=PUNCH_CARDS_CACHE_SIZE,
+    fresh_ttl=PUNCH_CARDS_FRESH_TTL,
+    stale_ttl=PUNCH_CARDS_STALE_TTL,
+)
+
+async def get_business_cards(chat_id: int, business_id: str) -> tuple[int, List[Dict[str, Any]]]:
+    """
+    (status, карточки) заведения. Список одинаков для всех, поэтому кэшируется
+    по business_id; одновременные запросы одного заведения идут в API один раз.
+    Запрос идёт с кукой чата: ошибку (403 истёкшей сессии) получает только тот,
+    чей это был запрос, — остальные ждавшие спрашивают API сами.
+    """
+    own = False
+
+    async def fetch():
+        nonlocal own
+        own = True
+        status, payload = await request(
+            chat_id, "GET", f"/businesses/{business_id}/punch-cards/",
+            params={"limit": 50, "offset": 0},
+            retry=True,
+        )
+        return status, (unwrap(payload, as_list=True) if status == 200 else [])
+
+    result = await _punch_cards.get(business_id, fetch, cacheable=lambda r: r[0] == 200)
+    if result[0] != 200 and not own:
+        return await fetch()
+    return result
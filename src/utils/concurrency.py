@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import TelegramObject, Update
+
+from config import MAX_CONCURRENT_UPDATES, MAX_WAITING_UPDATES, CHAT_MAX_WAITING
+from .metrics import UPDATES_RUNNING, UPDATES_WAITING, UPDATE_WAIT_SECONDS, UPDATES_DROPPED
+
+logger = logging.getLogger(__name__)
+
+# Polling и webhook с handle_in_background запускают задачу на каждый апдейт
+# без ограничений. Здесь:
+#   - апдейты одного чата обрабатываются строго по очереди (двойные нажатия
+#     в сценарии логина не гоняются за состояние FSM);
+#   - одновременно обрабатывается не больше MAX_CONCURRENT_UPDATES апдейтов;
+#   - при переполнении очереди (общей или чата) апдейт отбрасывается —
+#     лучше потерять лишнее нажатие, чем копить задачи и соединения.
+# Апдейты без чата (inline-запросы) упорядочивать незачем, они ждут только общий лимит.
+
+class _ChatQueue:
+    __slots__ = ("lock", "size")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.size = 0  # ждут + обрабатывается сейчас
+
+class UpdateLimiter(BaseMiddleware):
+    """Outer-middleware на update, стоит перед FSM: состояние читается уже под замком чата."""
+
+    def __init__(self, max_concurrent: int, max_waiting: int, chat_max_waiting: int):
+        self.max_waiting = max_waiting
+        self.chat_max_waiting = chat_max_waiting
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._chats: Dict[int, _ChatQueue] = {}
+        self.running = 0
+        self.waiting = 0
+
+    def _drop(self, reason: str, event: Update) -> Any:
+        UPDATES_DROPPED.labels(reason).inc()
+        logger.warning("update %s dropped: %s queue is full", event.update_id, reason)
+        return UNHANDLED
+
+    async def _run(self, handler, event: Update, data: Dict[str, Any], queued: float) -> Any:
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        UPDATE_WAIT_SECONDS.observe(time.perf_counter() - queued)
+        self.running += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        if self.waiting >= self.max_waiting:
+            return self._drop("global", event)
+
+        queued = time.perf_counter()
+        chat = data.get("event_chat")
+        if chat is None:
+            self.waiting += 1
+            return await self._run(handler, event, data, queued)
+
+        queue = self._chats.get(chat.id)
+        if queue is None:
+            queue = self._chats[chat.id] = _ChatQueue()
+        if queue.size >= self.chat_max_waiting:
+            return self._drop("chat", event)
+
+        queue.size += 1
+        self.waiting += 1
+        try:
+            try:
+                await queue.lock.acquire()
+            except BaseException:
+                self.waiting -= 1
+                raise
+            try:
+                return await self._run(handler, event, data, queued)
+            finally:
+                queue.lock.release()
+        finally:
+            queue.size -= 1
+            if queue.size == 0:
+                self._chats.pop(chat.id, None)
+
+def setup_limiter(dp: Dispatcher) -> UpdateLimiter | None:
+    if MAX_CONCURRENT_UPDATES <= 0:
+        return None
+    limiter = UpdateLimiter(MAX_CONCURRENT_UPDATES, MAX_WAITING_UPDATES, CHAT_MAX_WAITING)
+    # встаём прямо перед FSMContextMiddleware (после UserContextMiddleware, которая даёт event_chat):
+    # публичный outer_middleware() добавил бы нас в конец, уже после чтения состояния
+    middlewares = dp.update.outer_middleware._middlewares
+    middlewares.insert(middlewares.index(dp.fsm), limiter)
+    UPDATES_RUNNING.set_function(lambda: limiter.running)
+    UPDATES_WAITING.set_function(lambda: limiter.waiting)
+    return limiter
@@ -0,0 +1,120 @@
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware, Dispatcher, Router
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.types import Message, TelegramObject
+
+from .tracing import annotate
+
+# Быстрый путь для текстовых сообщений: точные тексты reply-кнопок, известные
+# префиксы и коды из N цифр находятся по словарю, минуя перебор фильтров всех
+# роутеров. Хендлеры регистрируются в роутерах как обычно (это и запасной путь),
+# а декораторы ниже только добавляют их в таблицу:
+#
+#     @fast_path.text("🎴 Мои карты")
+#     @router.message(F.text == "🎴 Мои карты")
+#     async def reply_cards(message): ...
+#
+# Вызов идёт через inner-middleware наблюдателя (метрики, трассировка), как у
+# обычного хендлера. Префиксы и коды срабатывают только без состояния FSM:
+# в сценарии логина/регистрации текст должен достаться хендлеру состояния.
+# Точные тексты — при любом состоянии, поэтому в таблицу можно добавлять лишь
+# хендлеры без фильтра состояния из роутера, который стоит раньше auth.
+
+Callback = Callable[..., Awaitable[Any]]
+Entry = Tuple[Router, TelegramEventObserver, HandlerObject]
+
+
+class FastPath(BaseMiddleware):
+    """Outer-middleware на dp.message."""
+
+    def __init__(self):
+        self._texts: Dict[str, Callback] = {}
+        self._prefixes: Dict[str, Callback] = {}
+        self._digits: Dict[int, Callback] = {}
+        self._exact: Dict[str, Entry] = {}
+        self._by_prefix: Dict[str, Entry] = {}
+        self._by_digits: Dict[int, Entry] = {}
+        self._prefix_lengths: Tuple[int, ...] = ()
+
+    # ===== Регистрация =====
+
+    def text(self, value: str):
+        def decorator(callback: Callback) -> Callback:
+            self._texts[value] = callback
+            return callback
+        return decorator
+
+    def prefix(self, value: str):
+        def decorator(callback: Callback) -> Callback:
+            self._prefixes[value] = callback
+            return callback
+        return decorator
+
+    def digits(self, length: int):
+        def decorator(callback: Callback) -> Callback:
+            self._digits[length] = callback
+            return callback
+        return decorator
+
+    def install(self, dp: Dispatcher):
+        """Находит HandlerObject для зарегистрированных функций и вешает middleware."""
+        found: Dict[Callback, Entry] = {}
+        for router in dp.chain_tail:
+            observer = router.message
+            for handler in observer.handlers:
+                found.setdefault(handler.callback, (router, observer, handler))
+
+        def resolve(callback: Callback) -> Entry:
+            if callback not in found:
+                raise RuntimeError(f"fast path: {callback.__qualname__} is not a message handler of this dispatcher")
+            return found[callback]
+
+        self._exact = {k: resolve(cb) for k, cb in self._texts.items()}
+        self._by_prefix = {k: resolve(cb) for k, cb in self._prefixes.items()}
+        self._by_digits = {k: resolve(cb) for k, cb in self._digits.items()}
+        self._prefix_lengths = tuple(sorted({len(p) for p in self._by_prefix}))
+        dp.message.outer_middleware(self)
+
+    # ===== Поиск =====
+
+    def match(self, text: str, raw_state: str | None) -> Tuple[str, Entry] | None:
+        entry = self._exact.get(text)
+        if entry is not None:
+            return "text", entry
+        if raw_state is not None:
+            return None
+        for length in self._prefix_lengths:
+            entry = self._by_prefix.get(text[:length])
+            if entry is not None:
+                return "prefix", entry
+        if text.isdigit() and text.isascii():
+            entry = self._by_digits.get(len(text))
+            if entry is not None:
+                return "digits", entry
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        found = self.match(event.text, data.get("raw_state")) if event.text else None
+        if found is None:
+            return await handler(event, data)
+
+        kind, (router, observer, handler_obj) = found
+        annotate(fast_path=kind)
+        data.update(event_router=router, handler=handler_obj)
+        wrapped = observer.outer_middleware.wrap_middlewares(observer._resolve_middlewares(), handler_obj.call)
+        try:
+            return await wrapped(event, data)
+        except SkipHandler:
+            # хендлер отказался — пусть решает обычная цепочка роутеров
+            return await handler(event, data)
+
+
+fast_path = FastPath()
@@ -41,6 +41,27 @@ def confirm_inline_kb() -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="📨 Отправить код подтверждения", callback_data="sendcode_inline")]
     ])
 
+def resend_code_kb(remaining: int = 0) -> InlineKeyboardMarkup:
+    """
+    'Resend code' button: disabled with a countdown while remaining > 0.
+    """
+    if remaining > 0:
+        text = f"🔄 Отправить код повторно (через {remaining // 60}:{remaining % 60:02d})"
+        return InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=text, callback_data="wait")]
+        ])
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 Отправить код повторно", callback_data="resend_code")]
+    ])
+
+def reward_ready_kb(card_id: str, reward_name: str) -> InlineKeyboardMarkup:
+    """
+    Single button that opens the redeem QR for a filled card.
+    """
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"🎁 {reward_name}", callback_data=f"qr:redeem:{card_id}")]
+    ])
+
 # ===== Reply keyboards (bottom) =====
 
 def main_menu_reply_unauth() -> ReplyKeyboardMarkup:
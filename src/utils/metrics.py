@@ -0,0 +1,153 @@
+import re
+import time
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict
+
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from .tracing import span
+
+# ===== Метрики =====
+
+UPDATES = Counter("bot_updates_total", "Incoming updates", ["type"])
+UPDATE_SECONDS = Histogram("bot_update_seconds", "Full update processing time", ["type"])
+
+UPDATES_RUNNING = Gauge("bot_updates_running", "Updates being processed now")
+UPDATES_WAITING = Gauge("bot_updates_waiting", "Updates queued behind the concurrency limit or their chat")
+UPDATE_WAIT_SECONDS = Histogram("bot_update_wait_seconds", "Time an update waited before processing")
+UPDATES_DROPPED = Counter("bot_updates_dropped_total", "Updates dropped by backpressure", ["reason"])
+
+STREAM_UPDATES = Counter("bot_stream_updates_total", "Updates passed through Redis Streams", ["result"])
+
+PROGRESS_CHECKS = Counter("bot_progress_checks_total", "Card progress checks by outcome", ["result"])
+
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Handler execution time", ["handler"])
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handler exceptions", ["handler"])
+
+API_SECONDS = Histogram("bot_api_request_seconds", "ForFriends API latency", ["method", "path"])
+API_RESPONSES = Counter("bot_api_responses_total", "ForFriends API responses", ["method", "path", "status"])
+API_RETRIES = Counter("bot_api_retries_total", "Retried API requests", ["method", "path"])
+API_BREAKER_OPEN = Gauge("bot_api_breaker_open", "1 while the API circuit breaker is open")
+
+REDIS_SECONDS = Histogram(
+    "bot_redis_op_seconds", "Redis operation latency", ["op"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1),
+)
+
+QR_RENDER_SECONDS = Histogram("bot_qr_render_seconds", "QR render time in the pool")
+QR_QUEUE_SECONDS = Histogram("bot_qr_queue_wait_seconds", "QR wait before a pool worker picks it up")
+QR_REQUESTS = Counter("bot_qr_requests_total", "QR render requests", ["result"])
+QR_PENDING = Gauge("bot_qr_pending", "QR renders queued or running")
+
+TELEGRAM_SECONDS = Histogram("bot_telegram_request_seconds", "Telegram Bot API latency", ["method"])
+TELEGRAM_ERRORS = Counter("bot_telegram_errors_total", "Telegram Bot API errors", ["method", "error"])
+
+# /customers/<uuid>/cards/<uuid>/ → /customers/{id}/cards/{id}/
+_ID_SEGMENT = re.compile(r"/(?:[0-9a-fA-F]{8}-[0-9a-fA-F-]{27}|\d+)(?=/|$)")
+# сегмент после коллекции — всегда идентификатор, даже не uuid: /biz_<текст> из чата
+# иначе превратился бы в новую серию метрик на каждый запрос (кроме действий login/register)
+_COLLECTION_ITEM = re.compile(r"/(businesses|customers|cards)/(?!(?:login|register)(?:/|$))[^/]+")
+
+def path_template(path: str) -> str:
+    path = path.split("?", 1)[0]
+    path = _COLLECTION_ITEM.sub(r"/\1/{id}", path)
+    return "/" + _ID_SEGMENT.sub("/{id}", path).lstrip("/")
+
+def observe_redis(op: str):
+    """Декоратор для функций redis_client: время в bot_redis_op_seconds и спан в trace."""
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with span(f"redis {op}"):
+                    return await fn(*args, **kwargs)
+            finally:
+                REDIS_SECONDS.labels(op).observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+# ===== Middleware =====
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware на update: число апдейтов и полное время обработки по типу."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        event_type = event.event_type
+        UPDATES.labels(event_type).inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_SECONDS.labels(event_type).observe(time.perf_counter() - started)
+
+def handler_name(callback: Callable) -> str:
+    module = callback.__module__.removeprefix("handlers.")
+    return f"{module}.{callback.__name__}"
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: время конкретного хендлера (вызывается только после фильтров)."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_obj = data.get("handler")
+        name = handler_name(handler_obj.callback) if handler_obj else "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: латентность каждого вызова Bot API."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            TELEGRAM_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+def setup_metrics(dp: Dispatcher, bot: Bot | None = None):
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_mw = HandlerMetricsMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(handler_mw)
+    if bot is not None:
+        bot.session.middleware(TelegramMetricsMiddleware())
+
+# ===== HTTP =====
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    resp = web.Response(body=generate_latest())
+    resp.content_type = CONTENT_TYPE_LATEST.split(";")[0]
+    resp.charset = "utf-8"
+    return resp
@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import secrets
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from redis.exceptions import WatchError
+
+from config import (
+    PROGRESS_TOUCH_CACHE_SIZE,
+    PROGRESS_ENABLED, PROGRESS_INTERVAL, PROGRESS_BATCH, PROGRESS_CONCURRENCY, PROGRESS_ACTIVE_TTL,
+)
+from .api import request, unwrap
+from .cache import TTLCache
+from .keyboards import reward_ready_kb
+from .metrics import PROGRESS_CHECKS, observe_redis
+from .redis_client import PROGRESS_ACTIVE_KEY, progress_key, peek_session
+from .throttle import background_sends
+from . import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Фоновая проверка прогресса карточек: раз в PROGRESS_INTERVAL одна реплика
+# (замок в Redis) обходит активных пользователей, забирает их карточки условным
+# GET (на 304 тело не качается) и сравнивает с отпечатком progress:{chat_id}
+# (hash card_id -> "current/total"). Уведомление «награда готова» уходит только
+# при переходе карточки в заполненное состояние; первый обход пользователя
+# лишь запоминает отпечаток, чтобы не слать уведомления о старых наградах.
+# Отпечаток меняется compare-and-set (WATCH): если две реплики всё же проверят
+# чат одновременно, уведомит только та, чья запись прошла.
+
+ACTIVE_KEY = PROGRESS_ACTIVE_KEY  # ZSET chat_id -> время последнего обращения к карточкам
+LOCK_KEY = "progress:lock"
+BASELINE = "_"  # служебное поле: отпечаток уже снят (у пользователя может не быть карточек)
+PAGE_LIMIT = 100
+MAX_PAGES = 10
+
+# не пишем в ZSET на каждое листание: одной отметки в минуту достаточно
+_touched = TTLCache(maxsize=PROGRESS_TOUCH_CACHE_SIZE, ttl=60)
+
+@observe_redis("progress_touch")
+async def mark_active(chat_id: int):
+    if chat_id in _touched:
+        return
+    _touched.set(chat_id, True)
+    await redis_client.redis.zadd(ACTIVE_KEY, {str(chat_id): time.time()})
+
+def _fingerprint(card: Dict[str, Any]) -> str:
+    return f"{card.get('current_stamp_count')}/{card.get('total_stamp_count')}"
+
+def _filled(fingerprint: str | None) -> bool:
+    try:
+        current, total = (int(x) for x in fingerprint.split("/"))
+    except (AttributeError, ValueError):
+        return False
+    return total > 0 and current >= total
+
+@observe_redis("progress_load")
+async def _load(chat_id: int) -> Dict[str, str]:
+    name = progress_key(chat_id)
+    async with redis_client.redis.pipeline(transaction=False) as pipe:
+        pipe.hgetall(name)
+        pipe.expire(name, PROGRESS_ACTIVE_TTL)
+        fields, _ = await pipe.execute()
+    return fields
+
+@observe_redis("progress_save")
+async def _swap(chat_id: int, new: Dict[str, str]) -> Dict[str, str] | None:
+    """Заменяет отпечаток на new. Возвращает прежний, или None, если его в это время поменял другой."""
+    name = progress_key(chat_id)
+    async with redis_client.redis.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(name)
+            old = await pipe.hgetall(name)
+            changed = {k: v for k, v in new.items() if old.get(k) != v}
+            removed = [k for k in old if k not in new]
+            pipe.multi()
+            if removed:
+                pipe.hdel(name, *removed)
+            if changed:
+                pipe.hset(name, mapping=changed)
+            pipe.expire(name, PROGRESS_ACTIVE_TTL)
+            await pipe.execute()
+        except WatchError:
+            return None
+    return old
+
+async def _fetch_cards(chat_id: int, customer_id: str) -> Tuple[int, List[Dict[str, Any]]]:
+    cards: List[Dict[str, Any]] = []
+    for page in range(MAX_PAGES):
+        status, payload = await request(
+            chat_id, "GET", f"/customers/{customer_id}/cards/",
+            params={"limit": PAGE_LIMIT, "offset": page * PAGE_LIMIT},
+            conditional=True,
+            retry=True,
+            touch_session=False,
+        )
+        if status != 200:
+            return status, []
+        chunk = unwrap(payload, as_list=True)
+        cards.extend(chunk)
+        if len(chunk) < PAGE_LIMIT:
+            break
+    return 200, cards
+
+async def _notify(bot: Bot, chat_id: int, card: Dict[str, Any]):
+    reward_name = card.get("reward_name") or "Награда"
+    await bot.send_message(
+        chat_id,
+        f"🏆 Награда готова!\n<b>{card.get('name', '—')}</b> — {reward_name}\n\n"
+        "Покажите QR-код на кассе.",
+        reply_markup=reward_ready_kb(card.get("id"), reward_name),
+    )
+
+async def check_chat(bot: Bot, chat_id: int) -> str:
+    """Проверка одного пользователя. Возвращает исход: stale — убрать из активных."""
+    # не через get_customer_id: обход тысяч чатов вытеснил бы горячие сессии из LRU
+    customer_id, _ = await peek_session(chat_id)
+    if not customer_id:
+        return "stale"
+    status, cards = await _fetch_cards(chat_id, customer_id)
+    if status == 403:
+        return "stale"
+    if status != 200:
+        return "error"
+
+    new = {str(c["id"]): _fingerprint(c) for c in cards if c.get("id")}
+    new[BASELINE] = "1"
+    if await _load(chat_id) == new:
+        return "unchanged"
+    # решение об уведомлении — по отпечатку, который заменила именно наша запись
+    old = await _swap(chat_id, new)
+    if old is None:
+        return "raced"
+    if BASELINE not in old:
+        return "baseline"
+
+    ready = [c for c in cards if _filled(new.get(str(c.get("id")))) and not _filled(old.get(str(c.get("id"))))]
+    for card in ready:
+        try:
+            await _notify(bot, chat_id, card)
+        except TelegramForbiddenError:
+            return "stale"
+        except TelegramBadRequest as e:
+            logger.warning("reward notification to %s failed: %r", chat_id, e)
+            continue
+        PROGRESS_CHECKS.labels("notified").inc()
+    return "changed"
+
+# ===== Замок обхода =====
+# Держим PROGRESS_INTERVAL и продлеваем, пока обход идёт: медленный обход не должен
+# пересечься со следующим на другой реплике. Все операции — только своим токеном.
+
+async def _owned(token: str, action: Callable[[Any], None]) -> bool:
+    """Выполняет action над замком в MULTI, если замок всё ещё наш."""
+    async with redis_client.redis.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(LOCK_KEY)
+            if await pipe.get(LOCK_KEY) != token:
+                return False
+            pipe.multi()
+            action(pipe)
+            await pipe.execute()
+            return True
+        except WatchError:
+            return False
+
+async def _hold_lock(token: str):
+    while True:
+        await asyncio.sleep(PROGRESS_INTERVAL / 3)
+        try:
+            held = await _owned(token, lambda pipe: pipe.expire(LOCK_KEY, PROGRESS_INTERVAL))
+        except Exception:
+            logger.exception("progress lock renewal failed")
+            held = False
+        if not held:
+            logger.warning("progress lock lost, stopping the pass")
+            return
+
+async def _release_lock(token: str, started: float):
+    # следующий обход — не раньше чем через PROGRESS_INTERVAL от начала этого,
+    # с какой бы реплики он ни стартовал: короткий обход оставляет замок до этого срока
+    left_ms = int((started + PROGRESS_INTERVAL - time.monotonic()) * 1000)
+    if left_ms > 0:
+        await _owned(token, lambda pipe: pipe.pexpire(LOCK_KEY, left_ms))
+    else:
+        await _owned(token, lambda pipe: pipe.delete(LOCK_KEY))
+
+async def run_pass(bot: Bot) -> int:
+    """Один обход активных пользователей. Возвращает число проверенных; 0 — обход у другой реплики."""
+    token = secrets.token_hex(8)
+    if not await redis_client.redis.set(LOCK_KEY, token, nx=True, ex=PROGRESS_INTERVAL):
+        return 0
+    started = time.monotonic()
+    holder = asyncio.create_task(_hold_lock(token))
+    try:
+        return await _run_pass(bot, holder)
+    finally:
+        holder.cancel()
+        await _release_lock(token, started)
+
+async def _run_pass(bot: Bot, holder: asyncio.Task) -> int:
+    await redis_client.redis.zremrangebyscore(ACTIVE_KEY, "-inf", time.time() - PROGRESS_ACTIVE_TTL)
+
+    semaphore = asyncio.Semaphore(PROGRESS_CONCURRENCY)
+    stale: List[str] = []
+    checked = 0
+
+    async def guarded(chat_id: str) -> str:
+        async with semaphore:
+            return await check_chat(bot, int(chat_id))
+
+    async def run_batch(chat_ids: List[str]):
+        with background_sends():
+            results = await asyncio.gather(*(guarded(c) for c in chat_ids), return_exceptions=True)
+        for chat_id, result in zip(chat_ids, results):
+            if isinstance(result, Exception):
+                logger.warning("progress check for %s failed: %r", chat_id, result)
+                result = "error"
+            PROGRESS_CHECKS.labels(result).inc()
+            if result == "stale":
+                stale.append(chat_id)
+
+    # ZSCAN, а не ZRANGE по смещению: отметки активности во время обхода меняют
+    # порядок элементов; повтор пользователя безвреден, пропуск — нет
+    batch: List[str] = []
+    async for chat_id, _ in redis_client.redis.zscan_iter(ACTIVE_KEY, count=PROGRESS_BATCH):
+        if holder.done():
+            # замок ушёл к другой реплике — дальше идёт её обход
+            batch = []
+            break
+        batch.append(chat_id)
+        if len(batch) >= PROGRESS_BATCH:
+            await run_batch(batch)
+            checked += len(batch)
+            batch = []
+    if batch:
+        await run_batch(batch)
+        checked += len(batch)
+
+    if stale:
+        await redis_client.redis.zrem(ACTIVE_KEY, *stale)
+    return checked
+
+async def _progress_loop(bot: Bot):
+    while True:
+        try:
+            await run_pass(bot)
+        except Exception:
+            logger.exception("progress pass crashed")
+        await asyncio.sleep(PROGRESS_INTERVAL)
+
+_progress_task: asyncio.Task | None = None
+
+async def start_progress_watcher(bot: Bot):
+    global _progress_task
+    if PROGRESS_ENABLED and _progress_task is None:
+        _progress_task = asyncio.create_task(_progress_loop(bot))
+
+async def stop_progress_watcher():
+    global _progress_task
+    if _progress_task is not None:
+        _progress_task.cancel()
+        _progress_task = None
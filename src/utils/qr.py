@@ -1,10 +1,17 @@
 # utils/qr.py
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from io import BytesIO
 from typing import Literal
 
-import qrcode
 from aiogram.types import BufferedInputFile
 
+from config import QR_CACHE_SIZE, QR_EXECUTOR, QR_WORKERS, QR_MAX_PENDING
+from .cache import TTLCache
+from .tracing import span
+from .metrics import QR_RENDER_SECONDS, QR_QUEUE_SECONDS, QR_REQUESTS, QR_PENDING
+
 # Базовый путь/хост. По умолчанию шьём только путь, как ты просил.
 API_HOST = "https://api.forfriends.space"  # при необходимости переопредели
 API_PREFIX = "/api/v1"
@@ -16,6 +23,10 @@ def build_qr_text(customer_id: str, card_id: str, action: Literal["stamp", "rede
 
 def make_qr_bytes(text: str) -> bytes:
     """Генерирует PNG-QR в памяти (bytes). Бросает исключение при сбое."""
+    # qrcode тянет PIL (~40 мс импорта): грузим при первом рендере, а не на старте,
+    # в process-пуле — в каждом воркере
+    import qrcode
+
     qr = qrcode.QRCode(
         version=None,
         error_correction=qrcode.constants.ERROR_CORRECT_M,
@@ -30,5 +41,71 @@ def make_qr_bytes(text: str) -> bytes:
     bio.seek(0)
     return bio.read()
 
-def make_qr_input_file(text: str, filename: str) -> BufferedInputFile:
-    return BufferedInputFile(make_qr_bytes(text), filename=filename)
+# ===== Рендер вне event loop =====
+
+class QRBusyError(RuntimeError):
+    """Очередь рендера переполнена — лучше попросить повторить, чем копить задачи."""
+
+# Текст QR для (customer_id, card_id, action) не меняется — PNG можно переиспользовать
+_png_cache = TTLCache(maxsize=QR_CACHE_SIZE)
+
+_executor: Executor | None = None
+_pending = 0  # ждут в очереди + рендерятся сейчас
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if QR_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=QR_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=QR_WORKERS, thread_name_prefix="qr")
+    return _executor
+
+def shutdown_qr_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _render_timed(text: str) -> tuple[bytes, float, float]:
+    # time.time(), а не monotonic: значение должно быть сравнимо между процессами
+    started = time.time()
+    png = make_qr_bytes(text)
+    return png, started, time.time()
+
+async def render_qr(text: str) -> bytes:
+    """PNG для текста: из кэша или рендером в пуле. Бросает QRBusyError при переполнении."""
+    global _pending
+    png = _png_cache.get(text)
+    if png is not None:
+        QR_REQUESTS.labels("cache_hit").inc()
+        return png
+
+    if _pending >= QR_MAX_PENDING:
+        QR_REQUESTS.labels("rejected").inc()
+        raise QRBusyError("QR render queue is full")
+
+    _pending += 1
+    submitted = time.time()
+    try:
+        with span("qr render", pending=_pending):
+            loop = asyncio.get_running_loop()
+            png, started, finished = await loop.run_in_executor(_get_executor(), _render_timed, text)
+    finally:
+        _pending -= 1
+
+    # ожидание в очереди пула и сам рендер считаем отдельно
+    QR_REQUESTS.labels("rendered").inc()
+    QR_QUEUE_SECONDS.observe(max(0.0, started - submitted))
+    QR_RENDER_SECONDS.observe(finished - started)
+
+    _png_cache.set(text, png)
+    return png
+
+def qr_pending() -> int:
+    return _pending
+
+QR_PENDING.set_function(qr_pending)
+
+async def make_qr_input_file(text: str, filename: str) -> BufferedInputFile:
+    return BufferedInputFile(await render_qr(text), filename=filename)
@@ -0,0 +1,164 @@
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import re
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from config import RECORD_FILE, RECORD_SALT
+
+logger = logging.getLogger(__name__)
+
+# Запись входящих апдейтов для офлайн-воспроизведения (bench/replay.py).
+# Каждая строка gzip-JSONL: {"ts": unix-время прихода, "update": апдейт}.
+# Идентификаторы пользователей и чатов заменены HMAC-псевдонимами (стабильны
+# в пределах одной соли), имена и юзернеймы выброшены, телефоны, пароли
+# и коды подтверждения заменены правдоподобными заглушками.
+
+FLUSH_EVERY = 100
+
+PHONE_RE = re.compile(r"\+?\d[\d\s\-()]{9,}\d")
+CODE_RE = re.compile(r"^\s*\d{4}\s*$")
+
+# Что пользователь вводит в этих состояниях FSM, в запись не попадает
+REDACTED_STATES = {
+    "RegisterFlow:name": "Имя",
+    "RegisterFlow:birth_date": "01.01.2000",
+    "RegisterFlow:password": "redacted-password",
+    "LoginFlow:password": "redacted-password",
+}
+PHONE_STATES = {"RegisterFlow:phone", "LoginFlow:phone"}
+
+# Поля пользователя/чата, которые оставляем как есть
+PERSON_KEEP = ("is_bot", "type", "language_code")
+
+
+class UpdateRecorder(BaseMiddleware):
+    """Outer-middleware на update: пишет обезличенный апдейт и передаёт его дальше."""
+
+    def __init__(self, path: str, salt: str | None = None):
+        self.path = path
+        self.salt = (salt or secrets.token_hex(16)).encode()
+        self._file = None
+        self._pending = 0
+
+    # ===== Обезличивание =====
+
+    def _anon_id(self, value: int) -> int:
+        digest = hmac.new(self.salt, str(value).encode(), hashlib.sha256).digest()
+        anon = 10**9 + int.from_bytes(digest[:8], "big") % 10**9
+        # у групп id отрицательные — знак сохраняем
+        return anon if value > 0 else -anon
+
+    def _phone(self, user_id: int | None) -> str:
+        return f"+7{abs(user_id or 0) % 10**10:010d}"
+
+    def _person(self, obj: Dict[str, Any]) -> Dict[str, Any]:
+        anon = self._anon_id(obj["id"])
+        out = {"id": anon, **{k: obj[k] for k in PERSON_KEEP if k in obj}}
+        if "first_name" in obj:
+            out["first_name"] = f"u{abs(anon)}"
+        return out
+
+    def _text(self, text: str, raw_state: str | None, user_id: int | None) -> str:
+        # состояние важнее формы: пароль вида "/secret" — всё равно пароль
+        if raw_state in REDACTED_STATES:
+            return REDACTED_STATES[raw_state]
+        if raw_state in PHONE_STATES:
+            return self._phone(user_id)
+        if text.startswith("/"):
+            return text
+        if CODE_RE.match(text):
+            return "0000"
+        return PHONE_RE.sub(self._phone(user_id), text)
+
+    def _scrub(self, obj: Any, raw_state: str | None, user_id: int | None) -> Any:
+        if isinstance(obj, list):
+            return [self._scrub(v, raw_state, user_id) for v in obj]
+        if not isinstance(obj, dict):
+            return obj
+        out = {}
+        for key, value in obj.items():
+            if key in ("from", "user", "chat", "sender_chat") and isinstance(value, dict):
+                out[key] = self._person(value)
+            elif key == "phone_number":
+                out[key] = self._phone(user_id)
+            elif key == "user_id" and isinstance(value, int):
+                out[key] = self._anon_id(value)
+            elif key == "contact" and isinstance(value, dict):
+                contact = self._scrub(value, raw_state, user_id)
+                if "first_name" in contact:
+                    contact["first_name"] = "Имя"
+                out[key] = contact
+            elif key in ("text", "caption") and isinstance(value, str):
+                out[key] = self._text(value, raw_state, user_id)
+            elif key in ("reply_to_message", "location", "last_name", "username", "vcard"):
+                continue
+            else:
+                out[key] = self._scrub(value, raw_state, user_id)
+        return out
+
+    def anonymize(self, update: Update, raw_state: str | None, user_id: int | None) -> Dict[str, Any]:
+        anon_user = self._anon_id(user_id) if user_id else None
+        data = self._scrub(update.model_dump(mode="json", exclude_none=True, by_alias=True), raw_state, anon_user)
+        callback = data.get("callback_query")
+        if callback and "message" in callback:
+            # текст сообщения бота под кнопкой может содержать имя — оставляем только адрес
+            msg = callback["message"]
+            callback["message"] = {k: msg[k] for k in ("message_id", "date", "chat") if k in msg}
+        return data
+
+    # ===== Запись =====
+
+    def write(self, record: Dict[str, Any]):
+        if self._file is None:
+            # дописываем новым gzip-членом: файл читается целиком через gzip.open
+            self._file = gzip.open(self.path, "at", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._pending += 1
+        if self._pending >= FLUSH_EVERY:
+            self._file.flush()
+            self._pending = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            user = data.get("event_from_user")
+            self.write({
+                "ts": time.time(),
+                "update": self.anonymize(event, data.get("raw_state"), user.id if user else None),
+            })
+        except Exception:
+            logger.exception("cannot record update %s", event.update_id)
+        return await handler(event, data)
+
+
+def setup_recorder(dp: Dispatcher) -> UpdateRecorder | None:
+    """Включается переменной RECORD_FILE. Регистрировать после создания Dispatcher:
+    FSM-middleware уже стоит раньше и кладёт raw_state в data."""
+    if not RECORD_FILE:
+        return None
+    recorder = UpdateRecorder(RECORD_FILE, RECORD_SALT)
+    dp.update.outer_middleware(recorder)
+
+    async def close_recorder():
+        recorder.close()
+
+    dp.shutdown.register(close_recorder)
+    logger.info("recording updates to %s", RECORD_FILE)
+    return recorder
@@ -1,20 +1,189 @@
+import hashlib
+import json
+import time
 import redis.asyncio as aioredis
-from config import REDIS_HOST, REDIS_PORT
+from redis.exceptions import WatchError
+from aiogram.fsm.storage.redis import RedisStorage
+from config import (
+    REDIS_HOST, REDIS_PORT,
+    SESSION_CACHE_SIZE, SESSION_CACHE_TTL, SESSION_TTL, SESSION_MIGRATE_LEGACY,
+    FSM_STATE_TTL, FSM_DATA_TTL,
+    QR_FILE_ID_TTL,
+    HTTP_CACHE_TTL, HTTP_CACHE_MAX_ENTRIES,
+)
+from .cache import TTLCache
+from .metrics import observe_redis
 
 redis = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
 
+# Горячие сессии держим в памяти процесса несколько секунд:
+# хендлер и request() читают одну и ту же пару (customer_id, cookies).
+_sessions = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+
+# Сессия чата — один hash session:{chat_id} с полями customer_id и cookies
+# и скользящим TTL. Раньше это были две строки без срока жизни.
+def _session_key(chat_id: int) -> str:
+    return f"session:{chat_id}"
+
+def _legacy_keys(chat_id: int) -> tuple[str, str]:
+    return f"customer_id:{chat_id}", f"cookies:{chat_id}"
+
+# Ключи фоновой проверки прогресса (utils/progress.py) — здесь, чтобы выход их чистил
+PROGRESS_ACTIVE_KEY = "progress:active"
+
+def progress_key(chat_id: int) -> str:
+    return f"progress:{chat_id}"
+
+async def migrate_legacy_session(chat_id: int) -> dict:
+    """Переносит старые строковые ключи чата в hash. Возвращает перенесённые поля."""
+    customer_id, cookies = await redis.mget(*_legacy_keys(chat_id))
+    fields = {k: v for k, v in (("customer_id", customer_id), ("cookies", cookies)) if v}
+    if fields:
+        name = _session_key(chat_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            # поля, уже записанные в hash, новее старых строк
+            for field, value in fields.items():
+                pipe.hsetnx(name, field, value)
+            pipe.expire(name, SESSION_TTL)
+            pipe.delete(*_legacy_keys(chat_id))
+            await pipe.execute()
+    return fields
+
+@observe_redis("load_session")
+async def load_session(chat_id: int) -> tuple[str | None, str | None]:
+    """(customer_id, cookies): HGETALL и продление TTL одним пайплайном, с коротким кэшем в памяти."""
+    session = _sessions.get(chat_id)
+    if session is not None:
+        return session
+    name = _session_key(chat_id)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hgetall(name)
+        pipe.expire(name, SESSION_TTL)
+        fields, _ = await pipe.execute()
+    if not fields and SESSION_MIGRATE_LEGACY:
+        fields = await migrate_legacy_session(chat_id)
+    session = (fields.get("customer_id"), fields.get("cookies"))
+    # пустые сессии не кэшируем: вход мог случиться на другой реплике
+    if fields:
+        _sessions.set(chat_id, session)
+    return session
+
+async def _set_session_field(chat_id: int, field: str, value: str):
+    name = _session_key(chat_id)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(name, field, value)
+        pipe.expire(name, SESSION_TTL)
+        await pipe.execute()
+
+@observe_redis("set_customer_id")
 async def set_customer_id(chat_id: int, customer_id: str):
-    await redis.set(f"customer_id:{chat_id}", customer_id)
+    # заодно переносит старые ключи, чтобы hash не перекрыл их частично
+    session = _sessions.get(chat_id) or await load_session(chat_id)
+    await _set_session_field(chat_id, "customer_id", customer_id)
+    if chat_id in _sessions:
+        _sessions.set(chat_id, (customer_id, session[1]))
 
 async def get_customer_id(chat_id: int) -> str | None:
-    return await redis.get(f"customer_id:{chat_id}")
+    customer_id, _ = await load_session(chat_id)
+    return customer_id
 
+@observe_redis("clear_customer")
 async def clear_customer(chat_id: int):
-    await redis.delete(f"customer_id:{chat_id}")
-    await redis.delete(f"cookies:{chat_id}")
+    _sessions.pop(chat_id)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.delete(_session_key(chat_id), *_legacy_keys(chat_id), f"http_cache:{chat_id}", progress_key(chat_id))
+        pipe.zrem(PROGRESS_ACTIVE_KEY, str(chat_id))
+        await pipe.execute()
+
+# ===== Сессия для фоновых задач =====
+# Обход тысяч чатов не должен вытеснять горячие сессии из памяти
+# и продлевать жизнь сессиям тех, кто ботом давно не пользуется.
+
+@observe_redis("peek_session")
+async def peek_session(chat_id: int) -> tuple[str | None, str | None]:
+    """(customer_id, cookies) одним HMGET: без кэша в памяти и без EXPIRE."""
+    customer_id, cookies = await redis.hmget(_session_key(chat_id), "customer_id", "cookies")
+    return customer_id, cookies
+
+@observe_redis("update_cookies")
+async def update_cookies_raw(chat_id: int, cookie_str: str):
+    """Куки из ответа на фоновый запрос: только в существующую сессию (выход мог её удалить), TTL прежний."""
+    name = _session_key(chat_id)
+    async with redis.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(name)
+            if not await pipe.exists(name):
+                return
+            pipe.multi()
+            pipe.hset(name, "cookies", cookie_str)
+            await pipe.execute()
+        except WatchError:
+            # сессию в это время поменял хендлер — его данные новее
+            return
+    session = _sessions.pop(chat_id)
+    if session is not None:
+        _sessions.set(chat_id, (session[0], cookie_str))
 
 async def get_cookies_raw(chat_id: int) -> str | None:
-    return await redis.get(f"cookies:{chat_id}")
+    _, cookies = await load_session(chat_id)
+    return cookies
 
+@observe_redis("set_cookies")
 async def set_cookies_raw(chat_id: int, cookie_str: str):
-    await redis.set(f"cookies:{chat_id}", cookie_str)
+    session = _sessions.get(chat_id) or await load_session(chat_id)
+    if session[1] == cookie_str:
+        return
+    await _set_session_field(chat_id, "cookies", cookie_str)
+    if chat_id in _sessions:
+        _sessions.set(chat_id, (session[0], cookie_str))
+
+def _qr_key(qr_text: str) -> str:
+    return "qr_file:" + hashlib.sha1(qr_text.encode()).hexdigest()
+
+@observe_redis("get_qr_file_id")
+async def get_qr_file_id(qr_text: str) -> str | None:
+    return await redis.get(_qr_key(qr_text))
+
+@observe_redis("set_qr_file_id")
+async def set_qr_file_id(qr_text: str, file_id: str):
+    await redis.set(_qr_key(qr_text), file_id, ex=QR_FILE_ID_TTL)
+
+@observe_redis("clear_qr_file_id")
+async def clear_qr_file_id(qr_text: str):
+    await redis.delete(_qr_key(qr_text))
+
+@observe_redis("get_search")
+async def get_cached_search(query: str) -> list | None:
+    raw = await redis.get(f"search:{query}")
+    return json.loads(raw) if raw is not None else None
+
+@observe_redis("set_search")
+async def set_cached_search(query: str, items: list, ttl: int):
+    await redis.set(f"search:{query}", json.dumps(items, ensure_ascii=False), ex=ttl)
+
+# ===== HTTP-кэш условных запросов =====
+# http_cache:{chat_id} — hash: ключ запроса -> {"etag", "last_modified", "body", "ts"}
+
+@observe_redis("get_http_cache")
+async def get_http_cache(chat_id: int, key: str) -> dict | None:
+    raw = await redis.hget(f"http_cache:{chat_id}", key)
+    return json.loads(raw) if raw is not None else None
+
+@observe_redis("set_http_cache")
+async def set_http_cache(chat_id: int, key: str, entry: dict):
+    name = f"http_cache:{chat_id}"
+    entry = {**entry, "ts": time.time()}
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(name, key, json.dumps(entry, ensure_ascii=False))
+        pipe.expire(name, HTTP_CACHE_TTL)
+        pipe.hlen(name)
+        _, _, size = await pipe.execute()
+    if size > HTTP_CACHE_MAX_ENTRIES:
+        # вытесняем самые старые записи
+        entries = await redis.hgetall(name)
+        by_age = sorted(entries, key=lambda k: json.loads(entries[k]).get("ts", 0))
+        await redis.hdel(name, *by_age[:size - HTTP_CACHE_MAX_ENTRIES])
+
+def make_fsm_storage() -> RedisStorage:
+    """FSM-хранилище в общем Redis: состояние переживает рестарт и видно всем репликам."""
+    return RedisStorage(redis=redis, state_ttl=FSM_STATE_TTL, data_ttl=FSM_DATA_TTL)
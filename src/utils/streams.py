@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Chat, TelegramObject, Update, User
+from redis.exceptions import ResponseError
+
+from config import (
+    STREAM_SHARDS, STREAM_PREFIX, STREAM_GROUP, STREAM_MAXLEN,
+    STREAM_BATCH, STREAM_BLOCK_MS, STREAM_CLAIM_IDLE_MS,
+)
+from .metrics import STREAM_UPDATES
+from . import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Очередь апдейтов в Redis Streams: приёмник (main.py при STREAM_INGEST=1) делает
+# XADD в updates:{shard}, шард — chat_id % STREAM_SHARDS, так что апдейты одного
+# чата идут по порядку через один поток. Воркеры (worker.py) читают свои шарды
+# через consumer group и прогоняют апдейты через обычный Dispatcher: разные чаты
+# батча параллельно, апдейты одного чата строго по очереди; XACK — только после
+# обработки всего батча. Имя консьюмера — имя шарда, поэтому перезапущенный
+# воркер видит pending упавшего как свои и дочитывает их (XREADGROUP с id 0)
+# раньше новых: порядок апдейтов чата сохраняется.
+
+def stream_key(shard: int) -> str:
+    return f"{STREAM_PREFIX}:{shard}"
+
+def shard_for(chat_id: int) -> int:
+    return chat_id % STREAM_SHARDS
+
+def _order_key(chat: Chat | None, user: User | None) -> int:
+    """Ключ порядка и шарда: чат, для апдейтов без чата — пользователь."""
+    return chat.id if chat else (user.id if user else 0)
+
+# ===== Приём =====
+
+class StreamIngest(BaseMiddleware):
+    """Outer-middleware на update: кладёт апдейт в поток шарда вместо обработки."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        key = _order_key(data.get("event_chat"), data.get("event_from_user"))
+        await redis_client.redis.xadd(
+            stream_key(shard_for(key)),
+            {"update": event.model_dump_json(exclude_none=True, by_alias=True)},
+            maxlen=STREAM_MAXLEN,
+            approximate=True,
+        )
+        STREAM_UPDATES.labels("queued").inc()
+
+def setup_stream_ingest(dp: Dispatcher):
+    """Регистрировать последним: метрики, трассировка и запись стоят снаружи и видят апдейт."""
+    dp.update.outer_middleware(StreamIngest())
+
+# ===== Обработка =====
+
+def consumer_name(shard: int) -> str:
+    """Стабильное имя: шард читает ровно один воркер, на каком бы хосте он ни жил."""
+    return f"shard-{shard}"
+
+async def ensure_group(stream: str):
+    try:
+        await redis_client.redis.xgroup_create(stream, STREAM_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+async def _process(bot: Bot, dp: Dispatcher, stream: str, messages: List[Tuple[str, Dict[str, str]]]):
+    """
+    Батч сообщений одного шарда. Апдейты группируются по чату: внутри группы —
+    по очереди в порядке потока (двойное нажатие не обгонит первое), группы —
+    параллельно. XACK всего батча после обработки; если воркер упадёт раньше,
+    батч дочитает его преемник (_drain_pending).
+    """
+    chats: Dict[int, List[Update]] = {}
+    for msg_id, fields in messages:
+        if not fields:
+            continue  # запись уже вытеснена MAXLEN
+        try:
+            update = Update.model_validate_json(fields["update"], context={"bot": bot})
+        except Exception:
+            STREAM_UPDATES.labels("failed").inc()
+            logger.exception("malformed update %s in %s", msg_id, stream)
+            continue
+        event = UserContextMiddleware.resolve_event_context(update)
+        chats.setdefault(_order_key(event.chat, event.user), []).append(update)
+
+    async def one_chat(updates: List[Update]):
+        for update in updates:
+            try:
+                await dp.feed_update(bot, update)
+                STREAM_UPDATES.labels("processed").inc()
+            except Exception:
+                # ошибку не повторяем: необработанный апдейт лучше, чем бесконечный цикл;
+                # следующие апдейты чата всё равно обрабатываются
+                STREAM_UPDATES.labels("failed").inc()
+                logger.exception("update %s from %s failed", update.update_id, stream)
+
+    await asyncio.gather(*(one_chat(updates) for updates in chats.values()))
+    ids = [msg_id for msg_id, _ in messages]
+    if ids:
+        await redis_client.redis.xack(stream, STREAM_GROUP, *ids)
+
+async def _drain_pending(bot: Bot, dp: Dispatcher, stream: str, consumer: str):
+    """Свои неподтверждённые сообщения (воркер шарда перезапустился) — по порядку, до новых."""
+    start = "0"
+    while True:
+        response = await redis_client.redis.xreadgroup(
+            STREAM_GROUP, consumer, {stream: start}, count=STREAM_BATCH,
+        )
+        messages = [m for _, batch in response or [] for m in batch]
+        if not messages:
+            return
+        STREAM_UPDATES.labels("replayed").inc(len(messages))
+        logger.warning("replaying %d unacked updates from %s", len(messages), stream)
+        await _process(bot, dp, stream, messages)
+        start = messages[-1][0]
+
+async def consume(bot: Bot, dp: Dispatcher, shard: int):
+    stream = stream_key(shard)
+    consumer = consumer_name(shard)
+    await ensure_group(stream)
+    logger.info("consuming %s as %s", stream, consumer)
+    drained = False
+    next_claim = 0.0
+    while True:
+        try:
+            if not drained:
+                await _drain_pending(bot, dp, stream, consumer)
+                drained = True
+            if time.monotonic() >= next_claim:
+                # сообщения, зависшие у консьюмера с другим именем (воркеры до
+                # перехода на имена шардов) — до новых
+                _, claimed, *_ = await redis_client.redis.xautoclaim(
+                    stream, STREAM_GROUP, consumer,
+                    min_idle_time=STREAM_CLAIM_IDLE_MS, start_id="0-0", count=STREAM_BATCH,
+                )
+                if claimed:
+                    STREAM_UPDATES.labels("reclaimed").inc(len(claimed))
+                    logger.warning("reclaimed %d stuck updates from %s", len(claimed), stream)
+                    await _process(bot, dp, stream, claimed)
+                    continue
+                next_claim = time.monotonic() + STREAM_CLAIM_IDLE_MS / 1000 / 2
+
+            response = await redis_client.redis.xreadgroup(
+                STREAM_GROUP, consumer, {stream: ">"}, count=STREAM_BATCH, block=STREAM_BLOCK_MS,
+            )
+            for _, messages in response or []:
+                await _process(bot, dp, stream, messages)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("consumer for %s crashed, retrying", stream)
+            await asyncio.sleep(1)
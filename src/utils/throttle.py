@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from config import (
+    SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_CHAT_BURST,
+    SEND_GROUP_RATE, SEND_GROUP_BURST, SEND_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Фоновые отправки (таймеры, уведомления) пропускают интерактивные ответы вперёд
+_background = contextvars.ContextVar("background_send", default=False)
+
+@contextmanager
+def background_sends():
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+class TokenBucket:
+    """
+    Ведро токенов с резервированием: take() сразу списывает токен (баланс может уйти
+    в минус) и возвращает, сколько подождать. Ожидающие обслуживаются по порядку.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def penalize(self, seconds: float):
+        """Telegram попросил подождать — опустошаем ведро на это время."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: все исходящие send*/edit*/copy*/forward* проходят через
+    ведра токенов — общее (~30/с), на личный чат (~1/с) и на группу (~20/мин).
+    Интерактивные ответы идут раньше фоновых (background_sends()), TelegramRetryAfter
+    выдерживается и запрос повторяется.
+    """
+
+    LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(SEND_GLOBAL_RATE, SEND_GLOBAL_RATE)
+        self.chats: Dict[int | str, TokenBucket] = {}
+        self._interactive_waiting = 0
+        self._interactive_idle = asyncio.Event()
+        self._interactive_idle.set()
+        self._acquired = 0
+        self.stats = {"sent": 0, "throttled": 0, "retry_after": 0, "dropped": 0}
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = TokenBucket(
+                SEND_GROUP_RATE if is_group else SEND_CHAT_RATE,
+                SEND_GROUP_BURST if is_group else SEND_CHAT_BURST,
+            )
+            self.chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self):
+        # вёдра простаивающих чатов больше не нужны
+        self._acquired += 1
+        if self._acquired % 1000 == 0:
+            for chat_id in [c for c, b in self.chats.items() if b.idle()]:
+                del self.chats[chat_id]
+
+    async def _acquire(self, chat_id: int | str, background: bool):
+        wait = self._chat_bucket(chat_id).take()
+        if wait:
+            self.stats["throttled"] += 1
+            await asyncio.sleep(wait)
+
+        # за общее ведро интерактивные ответы конкурируют первыми
+        if background:
+            while self._interactive_waiting:
+                await self._interactive_idle.wait()
+            wait = self.global_bucket.take()
+            if wait:
+                await asyncio.sleep(wait)
+        else:
+            self._interactive_waiting += 1
+            self._interactive_idle.clear()
+            try:
+                wait = self.global_bucket.take()
+                if wait:
+                    await asyncio.sleep(wait)
+            finally:
+                self._interactive_waiting -= 1
+                if not self._interactive_waiting:
+                    self._interactive_idle.set()
+        self._prune()
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = type(method).__name__
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not name.startswith(self.LIMITED_PREFIXES):
+            return await make_request(bot, method)
+
+        background = _background.get()
+        attempt = 0
+        while True:
+            await self._acquire(chat_id, background)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.stats["retry_after"] += 1
+                self._chat_bucket(chat_id).penalize(e.retry_after)
+                if attempt >= SEND_MAX_RETRIES:
+                    self.stats["dropped"] += 1
+                    logger.warning("flood control: giving up %s to chat %s", name, chat_id)
+                    raise
+                attempt += 1
+                logger.warning("flood control: %s to chat %s, retry in %ss", name, chat_id, e.retry_after)
+                continue
+            self.stats["sent"] += 1
+            return response
+
+send_scheduler = SendScheduler()
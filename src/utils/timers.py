@@ -0,0 +1,89 @@
+import asyncio
+import json
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from config import TIMER_TICK, TIMER_BATCH, RESEND_CODE_STEP
+from .keyboards import resend_code_kb
+from .metrics import observe_redis
+from .redis_client import redis
+from .throttle import background_sends
+
+logger = logging.getLogger(__name__)
+
+# Отложенные правки кнопки "Отправить код повторно" лежат в одном ZSET:
+# score — когда править, member — что править. Таймеры переживают рестарт,
+# а любая реплика может их обработать.
+COUNTDOWN_KEY = "timers:countdown"
+
+async def schedule_countdown(chat_id: int, message_id: int, seconds: int):
+    """Запускает обратный отсчёт на кнопке; хендлер может сразу завершиться."""
+    remaining = max(0, seconds - RESEND_CODE_STEP)
+    await _schedule(chat_id, message_id, remaining, time.time() + RESEND_CODE_STEP)
+
+@observe_redis("timer_schedule")
+async def _schedule(chat_id: int, message_id: int, remaining: int, due: float):
+    member = json.dumps({"chat_id": chat_id, "message_id": message_id, "remaining": remaining})
+    await redis.zadd(COUNTDOWN_KEY, {member: due})
+
+@observe_redis("timer_claim")
+async def _claim_due(now: float) -> list[dict]:
+    members = await redis.zrangebyscore(COUNTDOWN_KEY, "-inf", now, start=0, num=TIMER_BATCH)
+    if not members:
+        return []
+    # ZREM возвращает 1 только той реплике, которая забрала запись первой
+    pipe = redis.pipeline(transaction=False)
+    for m in members:
+        pipe.zrem(COUNTDOWN_KEY, m)
+    removed = await pipe.execute()
+    return [json.loads(m) for m, ok in zip(members, removed) if ok]
+
+async def _fire(bot: Bot, timer: dict):
+    chat_id, message_id, remaining = timer["chat_id"], timer["message_id"], timer["remaining"]
+    try:
+        await bot.edit_message_reply_markup(
+            chat_id=chat_id, message_id=message_id, reply_markup=resend_code_kb(remaining)
+        )
+    except (TelegramBadRequest, TelegramForbiddenError):
+        # сообщение удалено или бот заблокирован — отсчёт больше не нужен
+        return
+    if remaining > 0:
+        step = min(RESEND_CODE_STEP, remaining)
+        await _schedule(chat_id, message_id, remaining - step, time.time() + step)
+
+async def run_tick(bot: Bot) -> int:
+    """Один тик: забрать все просроченные таймеры и отправить правки пачкой."""
+    timers = await _claim_due(time.time())
+    if timers:
+        with background_sends():
+            results = await asyncio.gather(*(_fire(bot, t) for t in timers), return_exceptions=True)
+        for r in results:
+            if isinstance(r, Exception):
+                logger.warning("countdown edit failed: %r", r)
+    return len(timers)
+
+async def _timer_loop(bot: Bot):
+    while True:
+        try:
+            # полная пачка — значит, есть ещё просроченные, тик сразу
+            if await run_tick(bot) >= TIMER_BATCH:
+                continue
+        except Exception:
+            logger.exception("timer tick crashed")
+        await asyncio.sleep(TIMER_TICK)
+
+_timer_task: asyncio.Task | None = None
+
+async def start_timers(bot: Bot):
+    global _timer_task
+    if _timer_task is None:
+        _timer_task = asyncio.create_task(_timer_loop(bot))
+
+async def stop_timers():
+    global _timer_task
+    if _timer_task is not None:
+        _timer_task.cancel()
+        _timer_task = None
@@ -0,0 +1,180 @@
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from config import TRACE_ENABLED, TRACE_BUFFER, TRACE_FILE
+
+logger = logging.getLogger(__name__)
+
+# Лёгкая трассировка: один trace на апдейт, внутри — спаны хендлера, Redis,
+# API и Telegram. Готовые trace'ы лежат в кольцевом буфере и, если задан
+# TRACE_FILE, дописываются в JSONL.
+
+class Trace:
+    __slots__ = ("trace_id", "name", "started_at", "_t0", "duration_ms", "attrs", "spans", "finished")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = 0.0
+        self.attrs = attrs
+        self.spans: List[Dict[str, Any]] = []
+        self.finished = False
+
+    def offset_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "attrs": self.attrs,
+            "spans": self.spans,
+        }
+
+# (trace, индекс родительского спана или -1 для корня)
+_current: ContextVar[tuple[Trace, int] | None] = ContextVar("trace", default=None)
+
+recent_traces: deque[Trace] = deque(maxlen=TRACE_BUFFER)
+_trace_file = None
+
+def _export(trace: Trace):
+    global _trace_file
+    recent_traces.append(trace)
+    if not TRACE_FILE:
+        return
+    try:
+        if _trace_file is None:
+            _trace_file = open(TRACE_FILE, "a", encoding="utf-8")
+        _trace_file.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")
+        _trace_file.flush()
+    except OSError:
+        logger.exception("cannot write trace to %s", TRACE_FILE)
+
+@contextmanager
+def start_trace(name: str, **attrs: Any) -> Iterator[Trace | None]:
+    if not TRACE_ENABLED:
+        yield None
+        return
+    trace = Trace(name, attrs)
+    token = _current.set((trace, -1))
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        trace.duration_ms = trace.offset_ms()
+        trace.finished = True
+        _export(trace)
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Спан внутри текущего trace. Вне trace (фоновые задачи) ничего не пишет.
+    Возвращает словарь атрибутов, в который можно добавить данные по ходу.
+    """
+    current = _current.get()
+    if current is None or current[0].finished:
+        yield attrs
+        return
+    trace, parent = current
+    record = {"name": name, "parent": parent, "start_ms": round(trace.offset_ms(), 3), "attrs": attrs}
+    trace.spans.append(record)
+    token = _current.set((trace, len(trace.spans) - 1))
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except Exception as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        _current.reset(token)
+
+def annotate(**attrs: Any):
+    """Добавить атрибуты в корень текущего trace."""
+    current = _current.get()
+    if current is not None:
+        current[0].attrs.update(attrs)
+
+def slowest_traces(n: int = 5) -> List[Trace]:
+    return sorted(recent_traces, key=lambda t: t.duration_ms, reverse=True)[:n]
+
+def format_trace(trace: Trace) -> str:
+    lines = [f"{trace.name} {trace.duration_ms:.1f} ms {trace.attrs}"]
+    depth = {-1: 0}
+    for i, s in enumerate(trace.spans):
+        depth[i] = depth.get(s["parent"], 0) + 1
+        extra = s["attrs"]
+        lines.append(
+            f"{'  ' * depth[i]}+{s['start_ms']:.1f} {s['name']} "
+            f"{s.get('duration_ms', 0):.1f} ms{' ' + str(extra) if extra else ''}"
+        )
+    return "\n".join(lines)
+
+# ===== Middleware =====
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer-middleware на update: открывает trace на всё время обработки апдейта."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        with start_trace(event.event_type, update_id=event.update_id, user_id=user.id if user else None):
+            return await handler(event, data)
+
+class HandlerSpanMiddleware(BaseMiddleware):
+    """Inner-middleware: спан выбранного хендлера."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_obj = data.get("handler")
+        name = handler_obj.callback.__qualname__ if handler_obj else "unknown"
+        annotate(handler=name)
+        with span(f"handler {name}"):
+            return await handler(event, data)
+
+class TelegramSpanMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: спан на каждый вызов Bot API."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        with span(f"telegram {type(method).__name__}"):
+            return await make_request(bot, method)
+
+def setup_tracing(dp: Dispatcher, bot: Bot | None = None):
+    if not TRACE_ENABLED:
+        return
+    dp.update.outer_middleware(TracingMiddleware())
+    handler_mw = HandlerSpanMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(handler_mw)
+    if bot is not None:
+        bot.session.middleware(TelegramSpanMiddleware())
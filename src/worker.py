@@ -0,0 +1,55 @@
+"""
+Воркер очереди апдейтов (Redis Streams).
+
+    STREAM_INGEST=1 python main.py           # приём: polling/webhook -> XADD
+    WORKER_SHARDS=0,1 python worker.py       # обработка шардов 0 и 1
+    WORKER_SHARDS=2,3 python worker.py       # ... на другом ядре/хосте
+
+Каждый шард должен читать ровно один воркер: апдейты чата лежат в одном шарде
+и обрабатываются по порядку. Консьюмер назван по шарду (shard-N), так что воркер,
+пришедший на место упавшего, сначала дочитывает его неподтверждённые сообщения.
+"""
+import asyncio
+import logging
+
+from aiogram import Bot
+
+from config import (
+    BOT_TOKEN, DEFAULT_BOT_PROPS,
+    METRICS_ENABLED, STREAM_SHARDS, WORKER_SHARDS, WORKER_METRICS_PORT,
+)
+from main import build_dispatcher, build_web_app, serve
+from utils.metrics import setup_metrics
+from utils.streams import consume
+from utils.throttle import send_scheduler
+from utils.tracing import setup_tracing
+
+logger = logging.getLogger(__name__)
+
+async def main():
+    bot = Bot(token=BOT_TOKEN, default=DEFAULT_BOT_PROPS)
+    bot.session.middleware(send_scheduler)
+    dp = build_dispatcher()
+    if METRICS_ENABLED:
+        setup_metrics(dp, bot)
+    setup_tracing(dp, bot)
+
+    shards = WORKER_SHARDS or list(range(STREAM_SHARDS))
+    tasks = []
+    if METRICS_ENABLED and WORKER_METRICS_PORT:
+        tasks.append(asyncio.create_task(serve(build_web_app(), WORKER_METRICS_PORT)))
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        tasks += [asyncio.create_task(consume(bot, dp, shard)) for shard in shards]
+        logger.info("worker started, shards %s", shards)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())